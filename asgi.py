@@ -0,0 +1,5 @@
+from main import create_app
+from utils.asgi import AsyncReadApp
+
+# ASGI entry point, the async_read GET routes run on the event loop: uvicorn asgi:app
+app = AsyncReadApp(create_app())
@@ -0,0 +1,119 @@
+"""
+Benchmark foreign key and lookup column queries with and without the model indexes.
+
+Seeds a fresh database with synthetic users, authors, categories, content and
+reviews, times a set of lookups with every index the models declare, drops
+those indexes and times the same lookups again, then adds them back with
+`flask db upgrade`'s upgrade_schema().
+
+Usage:
+    python benchmarks/index_lookups.py --reviews 1000000
+    DATABASE_URL=postgresql+psycopg2://... python benchmarks/index_lookups.py
+
+Without DATABASE_URL a temporary SQLite database is used. The tables in the
+target database are dropped and recreated, never point this at real data.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.schema import DropIndex
+
+
+def seed(db, models, users, content, reviews, batch_size=10000):
+    User, Author, Category, Content, Review = models
+    db.session.execute(db.insert(Author), [{'author': f'Author {i}'} for i in range(1, 1001)])
+    db.session.execute(db.insert(Category), [{'category': f'Category {i}'} for i in range(1, 21)])
+    db.session.execute(db.insert(User), [
+        {'first_name': f'First{i}', 'last_name': f'Last{i}', 'email': f'user{i}@example.com', 'password': 'x'}
+        for i in range(1, users + 1)
+    ])
+    db.session.execute(db.insert(Content), [
+        {'title': f'Title {i}', 'author_id': random.randint(1, 1000), 'category_id': random.randint(1, 20),
+         'genre': f'Genre {random.randint(1, 50)}', 'description': 'Synthetic description',
+         'published': date(random.randint(1950, 2023), random.randint(1, 12), 1), 'publisher': 'Publisher'}
+        for i in range(1, content + 1)
+    ])
+    for start in range(0, reviews, batch_size):
+        db.session.execute(db.insert(Review), [
+            {'rating': random.randint(1, 5), 'comment': 'Synthetic comment', 'created': date.today(),
+             'user_id': random.randint(1, users), 'content_id': random.randint(1, content)}
+            for _ in range(min(batch_size, reviews - start))
+        ])
+    db.session.commit()
+
+
+def time_lookups(db, models, users, content, repeat):
+    User, Author, Category, Content, Review = models
+    lookups = {
+        'reviews by user_id': lambda: db.select(Review.id).where(Review.user_id == random.randint(1, users)).order_by(Review.id.desc()).limit(50),
+        'reviews by content_id': lambda: db.select(Review.id).where(Review.content_id == random.randint(1, content)).order_by(Review.id.desc()).limit(50),
+        'content by author_id': lambda: db.select(Content.id).where(Content.author_id == random.randint(1, 1000)),
+        'content by category_id': lambda: db.select(Content.id).where(Content.category_id == random.randint(1, 20)).order_by(Content.id.desc()).limit(50),
+        'content by genre': lambda: db.select(Content.id).where(Content.genre == f'Genre {random.randint(1, 50)}').limit(50),
+        'content by published range': lambda: db.select(Content.id).where(Content.published.between(date(2000, 1, 1), date(2000, 3, 1))),
+    }
+    results = {}
+    for name, build in lookups.items():
+        timings = []
+        for _ in range(repeat):
+            stmt = build()
+            start = time.perf_counter()
+            db.session.execute(stmt).all()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = statistics.median(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--content', type=int, default=100000)
+    parser.add_argument('--reviews', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp()}/benchmark.db'
+
+    from main import create_app
+    from init import db
+    from models.user import User
+    from models.author import Author
+    from models.category import Category
+    from models.content import Content
+    from models.review import Review
+    from utils.migrate import upgrade_schema
+    models = (User, Author, Category, Content, Review)
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        print(f'Seeding {args.users} users, {args.content} content, {args.reviews} reviews...')
+        seed(db, models, args.users, args.content, args.reviews)
+
+        with_indexes = time_lookups(db, models, args.users, args.content, args.repeat)
+
+        indexes = [index for table in (Content.__table__, Review.__table__) for index in table.indexes]
+        with db.engine.begin() as conn:
+            for index in indexes:
+                conn.execute(DropIndex(index))
+        without_indexes = time_lookups(db, models, args.users, args.content, args.repeat)
+        upgrade_schema()
+
+    print(f'\n{"lookup":<28}{"no index (ms)":>16}{"indexed (ms)":>16}{"speedup":>10}')
+    for name in with_indexes:
+        before, after = without_indexes[name], with_indexes[name]
+        print(f'{name:<28}{before:>16.2f}{after:>16.2f}{before / after:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
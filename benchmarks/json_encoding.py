@@ -0,0 +1,92 @@
+"""
+Compare the JSON backends' encode time and peak memory on list payloads.
+
+Builds the same payloads GET /content/ and GET /reviews/ return (in-memory
+rows dumped with contents_schema and reviews_schema), then encodes them into
+a response with the standard library backend and with orjson. Checks both
+decode to the same data before printing the timings.
+
+Usage:
+    python benchmarks/json_encoding.py --rows 10000 --repeat 5
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from benchmarks.serializers import build
+from main import create_app
+from models.content import contents_schema
+from models.review import reviews_schema
+from utils.json_provider import JSONProvider, orjson
+from utils.serializers import dump
+
+
+def encode_ms(provider, payload, repeat):
+    # The fastest run, with the garbage collector paused like timeit does
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            body = provider.response(payload).get_data()
+            times.append((time.perf_counter() - start) * 1000)
+        finally:
+            gc.enable()
+    return min(times), body
+
+
+def peak_kb(provider, payload):
+    gc.collect()
+    tracemalloc.start()
+    provider.response(payload).get_data()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if orjson is None:
+        sys.exit('orjson is not installed, there is nothing to compare with')
+
+    app = create_app()
+    providers = {}
+    for backend in ('stdlib', 'orjson'):
+        app.config['JSON_BACKEND'] = backend
+        providers[backend] = JSONProvider(app)
+        providers[backend].sort_keys = False
+
+    with app.app_context():
+        data = build(args.rows)
+        payloads = {
+            '/content/': dump(contents_schema, data['content']),
+            '/reviews/': dump(reviews_schema, data['reviews']),
+        }
+
+        print(f'{"payload":<12}{"backend":<9}{"rows":>7}{"size (KB)":>11}{"encode (ms)":>13}{"peak memory (KB)":>18}')
+        for name, payload in payloads.items():
+            decoded = {}
+            for backend, provider in providers.items():
+                ms, body = encode_ms(provider, payload, args.repeat)
+                decoded[backend] = json.loads(body)
+                print(f'{name:<12}{backend:<9}{len(payload):>7}{len(body) / 1024:>11.0f}{ms:>13.1f}{peak_kb(provider, payload):>18.0f}')
+            if decoded['orjson'] != decoded['stdlib']:
+                sys.exit(f'{name}: the backends produced different data')
+
+    print('\nBoth backends produced the same data')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,425 @@
+"""
+Load test every route against a seeded database and write a JSON report.
+
+Each route is requested --requests times, through the Flask test client or,
+with --server, over HTTP to a local threaded WSGI server with --concurrency
+clients. --server --asgi serves the app with uvicorn instead, where the
+async_read GET routes wait on the database without holding a thread (see
+utils/asgi.py), to compare how each holds up with many clients at once.
+The report has the p50/p99 latency, throughput, database queries per request
+and peak memory (tracemalloc, from --memory-samples extra requests) of every
+route, plus the dataset size and the commit it was run on, so reports from
+two releases or the two servers can be compared with --compare.
+
+Write routes run on rows the test creates itself: POST routes create the
+rows that the PUT and DELETE routes then change and delete. Rows added by the
+import and batch routes and registered users are left in the database.
+
+Usage:
+    python benchmarks/load_test.py --output report.json
+    python benchmarks/load_test.py --users 10000 --content 100000 --reviews 1000000 --output report.json
+    DATABASE_URL=postgresql+psycopg2://... python benchmarks/load_test.py --server --concurrency 8
+    DATABASE_URL=postgresql+psycopg2://... python benchmarks/load_test.py --server --asgi --concurrency 64
+    python benchmarks/load_test.py --compare old.json new.json
+
+Without DATABASE_URL a temporary SQLite database is created and seeded with
+`flask db seed-large`'s seed_large(). With DATABASE_URL the existing data is
+used (seed it with `flask db seed-large` first), or with --reset the tables
+are dropped, recreated and seeded, never use --reset on real data. The
+response cache is turned off unless --cache is given, so every request
+reaches the database. Query counts come from the SQL instrumentation's
+X-Query-Count header (see utils/sql_metrics.py). Streamed responses run
+their queries after the headers are sent, so their count shows as 0.
+"""
+import argparse
+import http.client
+import json
+import logging
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ADMIN_EMAIL = 'loadtest-admin@example.com'
+
+
+def percentile(values, pct):
+    # Nearest rank, so p99 of 100 requests is the 99th slowest, not an interpolation
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class TestClient:
+    """
+    Sends requests in-process with the Flask test client, one at a time.
+    """
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self, method, path, headers, body):
+        response = self.client.open(path, method=method, headers=headers, data=body)
+        return response.status_code, response.headers, response.get_data()
+
+    def close(self):
+        pass
+
+
+class LocalServer:
+    """
+    Runs the app in a threaded WSGI server on a free local port and sends requests over HTTP.
+    """
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        # Don't log every request
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def send(self, method, path, headers, body):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.headers, response.read()
+        finally:
+            conn.close()
+
+    def close(self):
+        self.server.shutdown()
+
+
+class LocalAsgiServer(LocalServer):
+    """
+    Runs the app under uvicorn with the async read path (asgi.py) and sends requests over HTTP.
+    """
+    def __init__(self, app):
+        import socket
+        import uvicorn
+        from utils.asgi import AsyncReadApp
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.port = sock.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(AsyncReadApp(app), log_level='warning'))
+        self.thread = threading.Thread(target=self.server.run, kwargs={'sockets': [sock]}, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+    def close(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def scenarios(ctx):
+    """
+    The requests for every route, in the order they are run.
+
+    Each scenario is (name, make_request, on_response). make_request returns
+    (method, path, body) where body is JSON-able or raw bytes for the import
+    routes, and on_response gets the decoded JSON of successful responses.
+    """
+    from utils.seed_large import TITLE_WORDS, GENRES, FIRST_NAMES, LAST_NAMES
+
+    rng = ctx['rng']
+    ids = ctx['ids']
+    created = {kind: deque() for kind in ('content', 'review', 'author', 'category')}
+    counter = iter(range(10 ** 9))
+
+    def remember(kind):
+        return lambda data: created[kind].append(data['id'])
+
+    def take(kind):
+        # Only rows the test created are deleted, 0 (a 404) if there are none left
+        return created[kind].popleft() if created[kind] else 0
+
+    def existing(kind):
+        return rng.choice(created[kind]) if created[kind] else rng.choice(ids[kind])
+
+    def content_body():
+        return {'title': f'The {rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS)}', 'author_id': rng.choice(ids['author']),
+                'category_id': rng.choice(ids['category']), 'genre': rng.choice(GENRES),
+                'description': 'A synthetic description for load testing', 'published': '2001-02-03', 'publisher': 'Load Test'}
+
+    def jsonl(rows):
+        return ''.join(json.dumps(row) + '\n' for row in rows).encode()
+
+    return [
+        ('GET /content/', lambda: ('GET', '/content/', None), None),
+        ('GET /content/?genre&sort=rating', lambda: ('GET', f'/content/?genre={quote(rng.choice(GENRES))}&sort=rating', None), None),
+        ('GET /content/?stream=ndjson', lambda: ('GET', '/content/?stream=ndjson', None), None),
+        ('GET /content/?ids=', lambda: ('GET', '/content/?ids=' + ','.join(map(str, rng.sample(ids['content'], min(20, len(ids['content']))))), None), None),
+        ('GET /content/<id>', lambda: ('GET', f'/content/{rng.choice(ids["content"])}', None), None),
+        ('GET /content/search', lambda: ('GET', f'/content/search?q={quote(rng.choice(TITLE_WORDS))}', None), None),
+        ('GET /content/<id>/stats', lambda: ('GET', f'/content/{rng.choice(ids["content"])}/stats', None), None),
+        ('GET /content/<id>/reviews', lambda: ('GET', f'/content/{rng.choice(ids["content"])}/reviews?sort=highest', None), None),
+        ('GET /content/top-rated', lambda: ('GET', '/content/top-rated', None), None),
+        ('GET /reviews/', lambda: ('GET', '/reviews/', None), None),
+        ('GET /reviews/<id>', lambda: ('GET', f'/reviews/{rng.choice(ids["review"])}', None), None),
+        ('GET /category/', lambda: ('GET', '/category/', None), None),
+        ('GET /category/<id>', lambda: ('GET', f'/category/{rng.choice(ids["category"])}', None), None),
+        ('GET /author/', lambda: ('GET', '/author/', None), None),
+        ('GET /author/<id>', lambda: ('GET', f'/author/{rng.choice(ids["author"])}', None), None),
+        ('GET /users/<id>/reviews', lambda: ('GET', f'/users/{rng.choice(ids["user"])}/reviews', None), None),
+        ('GET /users/me/reviews', lambda: ('GET', '/users/me/reviews', None), None),
+        ('GET /metrics/passwords', lambda: ('GET', '/metrics/passwords', None), None),
+        ('GET /metrics/db-pool', lambda: ('GET', '/metrics/db-pool', None), None),
+        ('POST /auth/register', lambda: ('POST', '/auth/register', {
+            'first_name': rng.choice(FIRST_NAMES), 'last_name': rng.choice(LAST_NAMES),
+            'email': f'loadtest-{ctx["run"]}-{next(counter)}@example.com', 'password': 'password1'}), None),
+        ('POST /auth/login', lambda: ('POST', '/auth/login', {'email': ADMIN_EMAIL, 'password': 'password1'}), None),
+        ('POST /author/', lambda: ('POST', '/author/', {'author': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'}), remember('author')),
+        ('PUT /author/<id>', lambda: ('PUT', f'/author/{existing("author")}', {'author': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'}), None),
+        ('POST /author/import', lambda: ('POST', '/author/import', jsonl(
+            {'author': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'} for _ in range(10))), None),
+        ('POST /category/', lambda: ('POST', '/category/', {'category': f'Load Test {ctx["run"]} {next(counter)}'}), remember('category')),
+        ('PUT /category/<id>', lambda: ('PUT', f'/category/{existing("category")}', {'category': f'Load Test {ctx["run"]} {next(counter)}'}), None),
+        ('POST /category/import', lambda: ('POST', '/category/import', jsonl(
+            {'category': f'Load Test {ctx["run"]} {next(counter)}'} for _ in range(10))), None),
+        ('POST /content/', lambda: ('POST', '/content/', content_body()), remember('content')),
+        ('PUT /content/<id>', lambda: ('PUT', f'/content/{existing("content")}', {'genre': rng.choice(GENRES)}), None),
+        ('POST /content/import', lambda: ('POST', '/content/import', jsonl(content_body() for _ in range(10))), None),
+        ('POST /reviews/', lambda: ('POST', '/reviews/', {
+            'content_id': rng.choice(ids['content']), 'rating': rng.randint(1, 5), 'comment': 'Load test review'}), remember('review')),
+        ('POST /reviews/batch', lambda: ('POST', '/reviews/batch', [
+            {'content_id': rng.choice(ids['content']), 'rating': rng.randint(1, 5), 'comment': 'Load test review'}
+            for _ in range(100)]), None),
+        ('PUT /reviews/<id>', lambda: ('PUT', f'/reviews/{existing("review")}', {'rating': rng.randint(1, 5)}), None),
+        ('DELETE /reviews/<id>', lambda: ('DELETE', f'/reviews/{take("review")}', None), None),
+        ('DELETE /content/<id>', lambda: ('DELETE', f'/content/{take("content")}', None), None),
+        ('DELETE /author/<id>', lambda: ('DELETE', f'/author/{take("author")}', None), None),
+        ('DELETE /category/<id>', lambda: ('DELETE', f'/category/{take("category")}', None), None),
+    ]
+
+
+def send(runner, token, make_request):
+    method, path, body = make_request()
+    headers = {'Authorization': f'Bearer {token}'}
+    if isinstance(body, bytes):
+        path += '?format=jsonl'
+        headers['Content-Type'] = 'application/x-ndjson'
+    elif body is not None:
+        body = json.dumps(body).encode()
+        headers['Content-Type'] = 'application/json'
+
+    start = time.perf_counter()
+    status, response_headers, data = runner.send(method, path, headers, body)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    queries = int(response_headers.get('X-Query-Count', 0))
+    return status, elapsed_ms, queries, 'X-Query-Warning' in response_headers, data
+
+
+def run_scenario(runner, token, scenario, requests, concurrency, memory_samples):
+    name, make_request, on_response = scenario
+
+    def one(_):
+        status, elapsed_ms, queries, warning, data = send(runner, token, make_request)
+        if on_response and status < 300:
+            on_response(json.loads(data))
+        return status, elapsed_ms, queries, warning
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    # Measured separately, tracing every allocation slows the requests down a lot
+    peak = 0
+    for _ in range(memory_samples):
+        tracemalloc.start()
+        one(None)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    latencies = [elapsed_ms for _, elapsed_ms, _, _ in results]
+    queries = [count for _, _, count, _ in results]
+    statuses = Counter(str(status) for status, _, _, _ in results)
+    return {
+        'requests': requests,
+        'errors': sum(count for status, count in statuses.items() if int(status) >= 400),
+        'status_codes': dict(sorted(statuses.items())),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'throughput_rps': round(requests / elapsed, 1),
+        'queries_per_request': {'mean': round(sum(queries) / len(queries), 2), 'max': max(queries)},
+        'n_plus_one_warnings': sum(warning for _, _, _, warning in results),
+        'peak_memory_kb': round(peak / 1024, 1) if memory_samples else None,
+    }
+
+
+def prepare(app, args):
+    from init import db, bcrypt
+    from models.author import Author
+    from models.category import Category
+    from models.content import Content
+    from models.review import Review
+    from models.user import User
+    from utils.search import create_search_index, drop_search_index
+    from utils.seed_large import seed_large
+
+    with app.app_context():
+        if args.reset:
+            drop_search_index()
+            db.drop_all()
+            db.create_all()
+            create_search_index()
+            print(f'Seeding {args.users} users, {args.content} content, {args.reviews} reviews...')
+            seed_large(args.users, args.content, args.reviews, seed=args.seed)
+
+        if not db.session.scalar(db.select(User).filter_by(email=ADMIN_EMAIL)):
+            db.session.add(User(first_name='Load', last_name='Test', email=ADMIN_EMAIL, is_admin=True,
+                                password=bcrypt.generate_password_hash('password1').decode('utf-8')))
+            db.session.commit()
+
+        ids = {}
+        for kind, model in (('content', Content), ('review', Review), ('author', Author), ('category', Category), ('user', User)):
+            # A random sample, so the lookups aren't all on the oldest rows
+            ids[kind] = db.session.scalars(db.select(model.id).order_by(db.func.random()).limit(10000)).all()
+            if not ids[kind]:
+                sys.exit(f'There are no {kind} rows, seed the database with `flask db seed-large` or use --reset')
+        dataset = {model.__tablename__: db.session.scalar(db.select(db.func.count()).select_from(model))
+                   for model in (User, Author, Category, Content, Review)}
+        database = db.engine.url.render_as_string(hide_password=True)
+    return ids, dataset, database
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f'{old_path}: {old.get("git_commit")} {old.get("dataset")}')
+    print(f'{new_path}: {new.get("git_commit")} {new.get("dataset")}\n')
+    print(f'{"route":<36}{"p50 (ms)":>20}{"p99 (ms)":>22}{"queries":>16}')
+    for name, after in new['routes'].items():
+        before = old['routes'].get(name)
+        if before is None:
+            print(f'{name:<36}{"new route":>20}')
+            continue
+        p50 = f'{before["p50_ms"]:.1f} -> {after["p50_ms"]:.1f}'
+        p99 = f'{before["p99_ms"]:.1f} -> {after["p99_ms"]:.1f}'
+        queries = f'{before["queries_per_request"]["mean"]:g} -> {after["queries_per_request"]["mean"]:g}'
+        print(f'{name:<36}{p50:>20}{p99:>22}{queries:>16}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100, help='Requests per route.')
+    parser.add_argument('--memory-samples', type=int, default=3, help='Extra requests per route traced for peak memory.')
+    parser.add_argument('--server', action='store_true', help='Send requests over HTTP to a local WSGI server.')
+    parser.add_argument('--asgi', action='store_true', help='With --server, serve the app with uvicorn and the async read path.')
+    parser.add_argument('--concurrency', type=int, default=1, help='Clients sending requests at once, with --server.')
+    parser.add_argument('--cache', action='store_true', help='Keep the response cache on.')
+    parser.add_argument('--reset', action='store_true', help='Drop, recreate and seed the tables first.')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--content', type=int, default=10000)
+    parser.add_argument('--reviews', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the data and the requests.')
+    parser.add_argument('--output', help='Where to write the JSON report, printed if not given.')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two reports instead of running.')
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare)
+    if args.concurrency > 1 and not args.server:
+        parser.error('--concurrency needs --server, the test client sends one request at a time')
+    if args.asgi and not args.server:
+        parser.error('--asgi needs --server')
+
+    if not os.environ.get('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp()}/load_test.db'
+        args.reset = True
+    os.environ.setdefault('JWT_SECRET_KEY', 'load-test')
+    if not args.cache:
+        os.environ['CACHE_BACKEND'] = 'none'
+    # Query counts come from the X-Query-Count header the instrumentation adds
+    os.environ['SQL_INSTRUMENTATION'] = 'true'
+    os.environ.setdefault('SQL_SLOW_QUERY_MS', '1000')
+
+    from main import create_app
+    from init import sql_metrics
+    app = create_app()
+    ids, dataset, database = prepare(app, args)
+
+    if args.server:
+        runner = LocalAsgiServer(app) if args.asgi else LocalServer(app)
+    else:
+        runner = TestClient(app)
+    status, _, data = runner.send('POST', '/auth/login', {'Content-Type': 'application/json'},
+                                  json.dumps({'email': ADMIN_EMAIL, 'password': 'password1'}).encode())
+    if status != 200:
+        sys.exit(f'Could not log in as {ADMIN_EMAIL}: {data.decode()}')
+    token = json.loads(data)['token']
+
+    ctx = {'rng': random.Random(args.seed), 'ids': ids, 'run': int(time.time())}
+    routes = {}
+    start = time.perf_counter()
+    try:
+        for scenario in scenarios(ctx):
+            routes[scenario[0]] = result = run_scenario(runner, token, scenario, args.requests, args.concurrency, args.memory_samples)
+            print(f'{scenario[0]:<36}p50 {result["p50_ms"]:>8.1f} ms  p99 {result["p99_ms"]:>8.1f} ms  '
+                  f'{result["throughput_rps"]:>7.1f} req/s  {result["queries_per_request"]["mean"]:>5g} queries  '
+                  f'{result["errors"]} errors', file=sys.stderr)
+    finally:
+        runner.close()
+    elapsed = time.perf_counter() - start
+
+    total_requests = sum(result['requests'] for result in routes.values())
+    report = {
+        'generated': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': database,
+        'mode': ('asgi-server' if args.asgi else 'server') if args.server else 'test-client',
+        'concurrency': args.concurrency,
+        'cache': args.cache,
+        'json_backend': app.json.backend,
+        'requests_per_route': args.requests,
+        'dataset': dataset,
+        'routes': routes,
+        'queries_grow_with_results': [endpoint for endpoint, route in sql_metrics.metrics()['routes'].items()
+                                      if route['grows_with_results']],
+        'total': {
+            'requests': total_requests,
+            'errors': sum(result['errors'] for result in routes.values()),
+            'elapsed_s': round(elapsed, 2),
+            'throughput_rps': round(total_requests / elapsed, 1),
+            # ru_maxrss is in KB on Linux
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Report written to {args.output}', file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Check the compiled dumpers match marshmallow byte for byte and time them.
+
+Builds in-memory (unsaved) model objects, dumps them with every schema in
+models/ (plus some ?fields= style only= variants) using both schema.dump()
+and utils.serializers.dump(), and compares the encoded JSON. Exits with an
+error if any output differs, then prints the time each takes. The full
+parity check, over every schema and ?fields= variant the controllers use,
+is tests/test_serializers.py and runs with the rest of the tests.
+
+Usage:
+    python benchmarks/serializers.py --rows 10000 --repeat 5
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from main import create_app
+from models.author import Author, authors_schema, AuthorSchema
+from models.category import Category, categories_schema
+from models.content import Content, contents_schema, ContentSchema
+from models.content_rating import ContentRating, content_ratings_schema
+from models.review import Review, reviews_schema, ReviewSchema
+from models.user import User, users_schema
+from utils.serializers import dump
+
+
+def build(rows):
+    categories = [Category(id=i, category=f'Category {i}') for i in range(1, 11)]
+    authors = [Author(id=i, author=f'Author {i}') for i in range(1, rows // 5 + 1)]
+    users = [User(id=i, first_name=f'First{i}', last_name=None if i % 7 == 0 else f'Last{i}',
+                  email=f'user{i}@example.com', password='x', is_admin=i == 1, year_born=1990)
+             for i in range(1, rows // 10 + 1)]
+    content = [
+        Content(id=i, title=f'Title {i}', genre=None if i % 11 == 0 else 'Genre', description='A description of the content',
+                published=None if i % 13 == 0 else date(2000 + i % 20, 1 + i % 12, 1), publisher='Publisher',
+                author=authors[i % len(authors)], author_id=authors[i % len(authors)].id,
+                category=categories[i % 10], category_id=categories[i % 10].id)
+        for i in range(1, rows + 1)
+    ]
+    reviews = [
+        Review(id=i, rating=random.randint(1, 5), comment=f'Comment {i}', created=date(2023, 7, 1),
+               user=users[i % len(users)], content=content[i % len(content)])
+        for i in range(1, rows + 1)
+    ]
+    ratings = [ContentRating(content_id=c.id, content=c, review_count=2, rating_sum=7, rating_average=3.5, histogram={'3': 1, '4': 1})
+               for c in content[:rows // 10]]
+    return {'content': content, 'reviews': reviews, 'authors': authors, 'categories': categories, 'users': users, 'ratings': ratings}
+
+
+def best_of(repeat, *fns):
+    """
+    Time each function repeat times and return the fastest time (ms) and the
+    result of each.
+
+    The functions take turns so they run under the same conditions, and like
+    timeit the garbage collector is paused while timing: the test data is a
+    large object graph and a full collection in the middle of a run would
+    swamp the time spent dumping.
+    """
+    times = [[] for _ in fns]
+    results = [None] * len(fns)
+    for _ in range(repeat):
+        for index, fn in enumerate(fns):
+            gc.collect()
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                results[index] = fn()
+                times[index].append((time.perf_counter() - start) * 1000)
+            finally:
+                gc.enable()
+    return [(min(fn_times), result) for fn_times, result in zip(times, results)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        data = build(args.rows)
+        cases = [
+            ('contents_schema', contents_schema, data['content']),
+            ('reviews_schema', reviews_schema, data['reviews']),
+            ('authors_schema', authors_schema, data['authors']),
+            ('categories_schema', categories_schema, data['categories']),
+            ('users_schema', users_schema, data['users']),
+            ('content_ratings_schema', content_ratings_schema, data['ratings']),
+            ('ContentSchema(only=title)', ContentSchema(many=True, only=('title',)), data['content']),
+            ('AuthorSchema(only=id,author)', AuthorSchema(many=True, only=('id', 'author')), data['authors']),
+            ('ReviewSchema(only=rating,user)', ReviewSchema(many=True, only=('rating', 'user')), data['reviews']),
+        ]
+
+        failed = False
+        print(f'{"schema":<34}{"rows":>8}{"marshmallow (ms)":>18}{"compiled (ms)":>16}{"speedup":>10}')
+        for name, schema, rows in cases:
+            # Only the dump is timed, the JSON encoding is the same for both
+            (marshmallow_ms, expected), (compiled_ms, actual) = best_of(
+                args.repeat, lambda: schema.dump(rows), lambda: dump(schema, rows))
+            expected, actual = app.json.dumps(expected), app.json.dumps(actual)
+
+            if actual != expected:
+                failed = True
+                print(f'{name}: OUTPUT DIFFERS')
+                continue
+            print(f'{name:<34}{len(rows):>8}{marshmallow_ms:>18.1f}{compiled_ms:>16.1f}{marshmallow_ms / compiled_ms:>9.1f}x')
+
+    if failed:
+        sys.exit('Compiled dumpers do not match marshmallow')
+    print('\nAll outputs identical')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 from flask import Blueprint, request
-from init import db, bcrypt
+from init import db
+from utils.passwords import hash_password, check_password, needs_rehash
 from models.user import User, user_schema, users_schema
 from flask_jwt_extended import create_access_token
 from sqlalchemy.exc import IntegrityError
@@ -33,7 +34,7 @@ def auth_register():
         user.email = body_data.get('email')
         # Hash password before storing in database
         if body_data.get('password'):
-            user.password = bcrypt.generate_password_hash(body_data.get('password')).decode('utf-8')
+            user.password = hash_password(body_data.get('password'))
         
         # Add user and commit to database
         db.session.add(user)
@@ -68,9 +69,15 @@ def auth_login():
     user = db.session.scalar(stmt)
     
     # Check if the user exists and the password is correct
-    if user and bcrypt.check_password_hash(user.password, body_data.get('password')):
+    if user and check_password(user.password, body_data.get('password')):
+        # Rehash the password if it was stored with a different work factor than the one configured
+        if needs_rehash(user.password):
+            user.password = hash_password(body_data.get('password'))
+            db.session.commit()
         # Generate a JWT access token for the user with a 1-day expiration
-        token = create_access_token(identity=str(user.id), expires_delta=timedelta(days=1))
+        # The admin flag is added as a claim so admin routes don't have to look the user up
+        token = create_access_token(identity=str(user.id), expires_delta=timedelta(days=1),
+                                    additional_claims={'is_admin': user.is_admin})
         # Return the user's email, JWT token, and if the user is an admin
         return {'email': user.email, 'token': token, 'is_admin': user.is_admin }
     else:
@@ -1,9 +1,18 @@
-from flask import Blueprint, request
-from init import db
+from flask import Blueprint, request, current_app
+from init import db, cache
 from models.user import User
 from models.author import Author, authors_schema, author_schema
-from flask_jwt_extended import get_jwt_identity, jwt_required
+from flask_jwt_extended import get_jwt, get_jwt_identity, jwt_required
+from utils.query import eager_load, select_fields, ids_arg, batch_response, paginate, page_headers
+from utils.streaming import wants_stream, stream_response
+from utils.serializers import dump
+from utils.async_db import async_read
+from utils.bulk_import import import_request
+from utils.search import index_content_where
+from utils.deletes import soft_delete_content_where
+from models.content import Content
 import functools
+import time
 
 
 def authorise_admin(fn):
@@ -11,9 +20,11 @@ def authorise_admin(fn):
     Check if the current user is an admin.
 
     This function checks if the current user, identified by the JWT token,
-    is the admin. It retrieves the user from the database based on
-    the user ID from the JWT token. It returns a boolean value
-    on whether the user is an admin or not
+    is the admin. The admin flag is carried in the token as the is_admin claim
+    set at login, so most admin requests don't need to query the database.
+    The claim is only trusted for ADMIN_CLAIM_TTL seconds after the token was
+    issued. After that (or for tokens without the claim) the user is looked up
+    in the database, so revoking admin status takes effect within the TTL.
 
 
     Returns:
@@ -22,6 +33,11 @@ def authorise_admin(fn):
     """
     @functools.wraps(fn)
     def wrapper(*args, **kwargs):
+        claims = get_jwt()
+        claim_expires = claims.get('iat', 0) + current_app.config['ADMIN_CLAIM_TTL']
+        if claims.get('is_admin') and time.time() < claim_expires:
+            return fn(*args, **kwargs)
+
         user_id = get_jwt_identity()
         try:
             stmt = db.select(User).filter_by(id=user_id)
@@ -39,21 +55,43 @@ def authorise_admin(fn):
 author_bp = Blueprint('author', __name__, url_prefix='/author')
 
 @author_bp.route('/')
+@async_read
+@cache.cached('author')
 def get_all_authors():
     """
     Route for retrieving all authors.
 
     This route retrieves a list of all authors from the database and returns it as JSON.
+    Results are paginated newest first using ?limit= (default 50, max 500) and ?after_id=.
+    ?stream=json or ?stream=ndjson streams every row in chunks instead of returning one page.
+    ?ids=1,2,3 returns just those authors in the order given, with an error object for any id not found.
+    ?fields= (e.g. ?fields=id,author) limits the fields returned and the columns selected.
 
     Returns:
-        A list of all authors as JSON objects with HTTP status code 200 (OK).
+        A page of authors as JSON objects with HTTP status code 200 (OK).
+        The X-Next-Cursor and Link headers give the after_id for the next page, if there is one.
+        An error message with HTTP status code 400 (Bad Request) if limit or after_id is invalid.
     """
-    stmt = db.select(Author).order_by(Author.id.desc())
-    authors = db.session.scalars(stmt)
-    return authors_schema.dump(authors)
+    # Only dump (and select) the fields asked for with ?fields=
+    schema = select_fields(authors_schema)
+    # ?ids=1,2,3 fetches just those authors, in that order, with one query
+    ids = ids_arg()
+    if ids is not None:
+        return batch_response(Author, schema, ids, 'Author')
+    # Load every author's content list in one query instead of once per author
+    stmt = eager_load(db.select(Author).order_by(Author.id.desc()), Author, schema)
+    # Large exports can be streamed in chunks instead of paged
+    if wants_stream():
+        return stream_response(stmt, Author.id, schema)
+
+    # Return one page at a time, the next page starts after the last id on this one
+    authors, next_cursor = paginate(stmt, Author.id)
+    return dump(schema, authors), 200, page_headers(next_cursor)
 
 
 @author_bp.route('/<int:id>')
+@async_read
+@cache.cached('author')
 def get_one_author(id):
     """
     Route for retrieving a single author by their ID.
@@ -62,15 +100,18 @@ def get_one_author(id):
 
     Parameters:
         id (int): The ID of the author to retrieve.
+    ?fields= (e.g. ?fields=id,author) limits the fields returned and the columns selected.
 
     Returns:
         The author data as a JSON object with HTTP status code 200 (OK) if the author is found.
         An error message as a JSON object with HTTP status code 404 (Not Found) if the author is not found.
     """
-    stmt = db.select(Author).filter_by(id=id)
+    # Only dump (and select) the fields asked for with ?fields=
+    schema = select_fields(author_schema)
+    stmt = eager_load(db.select(Author).filter_by(id=id), Author, schema)
     author = db.session.scalar(stmt)
     if author:
-        return author_schema.dump(author)
+        return dump(schema, author)
     else:
         # Return an error message if the input ID is not found
         return {'Error': f'Author not found with the id {id}'}, 404
@@ -104,9 +145,33 @@ def create_author():
     # Add the author to the database and commit the changes
     db.session.add(authors)
     db.session.commit()
+    cache.invalidate('author')
     return author_schema.dump(authors), 201
 
 
+@author_bp.route('/import', methods=['POST'])
+@jwt_required()
+@authorise_admin
+def import_authors():
+    """
+    Route for bulk importing authors.
+
+    This route allows admins to create many authors at once by sending a JSON Lines
+    or CSV file as the request body. Rows are validated and inserted in batches,
+    and rows with errors are skipped and reported instead of stopping the import.
+
+    Returns:
+        The number of authors imported and a list of per-row errors with HTTP status code 201 (Created).
+
+        An error message as a JSON object with HTTP status code 400 (Bad Request)
+        if no rows could be imported or the format is not supported.
+
+        An error message as a JSON object with HTTP status code 403 (Forbidden)
+        if the current user is not an admin.
+    """
+    return import_request('authors')
+
+
 @author_bp.route('/<int:id>', methods=['DELETE'])
 @jwt_required()
 @authorise_admin
@@ -131,8 +196,11 @@ def delete_one_author(id):
     author = db.session.scalar(stmt)
 
     if author:
-        db.session.delete(author)
+        # Soft deleted with its content, the rows are purged later in small batches
+        author.deleted_at = db.func.now()
+        soft_delete_content_where(Content.author_id == id)
         db.session.commit()
+        cache.invalidate('content', 'reviews', 'author', 'category')
         return {'Message': f'Author has been deleted successfully.'}
     else: 
         # Return an error message if the input ID is not found
@@ -166,7 +234,10 @@ def update_one_author(id):
         # Update author fields if provided, otherwise keep the existing values from database
         author.author = json_data.get('author', author.author)
 
+        # Author names are part of the content search index
+        index_content_where(Content.author_id == author.id)
         db.session.commit()
+        cache.invalidate('author', 'content')
         # Return the updated author as JSON with HTTP status code 200 (OK), if id doesn't exist return error
         return author_schema.dump(author)
     else:
@@ -1,9 +1,15 @@
 from flask import Blueprint, request
-from init import db
+from init import db, cache
 from models.user import User
 from models.category import Category, category_schema, categories_schema
 from flask_jwt_extended import get_jwt_identity, jwt_required
 from controllers.author_controller import authorise_admin
+from utils.query import eager_load, select_fields, ids_arg, batch_response, paginate, page_headers
+from utils.streaming import wants_stream, stream_response
+from utils.serializers import dump
+from utils.bulk_import import import_request
+from utils.deletes import soft_delete_content_where
+from models.content import Content
 
 
 # Blueprint for category routes
@@ -11,21 +17,41 @@ category_bp = Blueprint('category', __name__, url_prefix='/category')
 
 
 @category_bp.route('/')
+@cache.cached('category')
 def get_all_categories():
     """
     Route for retrieving all categories.
 
     This route retrieves a list of all categories from the database and returns it as JSON.
+    Results are paginated newest first using ?limit= (default 50, max 500) and ?after_id=.
+    ?stream=json or ?stream=ndjson streams every row in chunks instead of returning one page.
+    ?ids=1,2,3 returns just those categories in the order given, with an error object for any id not found.
+    ?fields= (e.g. ?fields=id,category) limits the fields returned and the columns selected.
 
     Returns:
-        A list of all categories as JSON objects with HTTP status code 200 (OK).
+        A page of categories as JSON objects with HTTP status code 200 (OK).
+        The X-Next-Cursor and Link headers give the after_id for the next page, if there is one.
+        An error message with HTTP status code 400 (Bad Request) if limit or after_id is invalid.
     """
-    stmt = db.select(Category).order_by(Category.id.desc())
-    categories = db.session.scalars(stmt)
-    return categories_schema.dump(categories)
+    # Only dump (and select) the fields asked for with ?fields=
+    schema = select_fields(categories_schema)
+    # ?ids=1,2,3 fetches just those categories, in that order, with one query
+    ids = ids_arg()
+    if ids is not None:
+        return batch_response(Category, schema, ids, 'Category')
+    # Load every category's content list in one query instead of once per category
+    stmt = eager_load(db.select(Category).order_by(Category.id.desc()), Category, schema)
+    # Large exports can be streamed in chunks instead of paged
+    if wants_stream():
+        return stream_response(stmt, Category.id, schema)
+
+    # Return one page at a time, the next page starts after the last id on this one
+    categories, next_cursor = paginate(stmt, Category.id)
+    return dump(schema, categories), 200, page_headers(next_cursor)
 
 
 @category_bp.route('/<int:id>')
+@cache.cached('category')
 def get_one_category(id):
     """
     Route for retrieving a single category by the ID.
@@ -34,15 +60,18 @@ def get_one_category(id):
 
     Parameters:
         id (int): The ID of the category to retrieve.
+    ?fields= (e.g. ?fields=id,category) limits the fields returned and the columns selected.
 
     Returns:
         The category data as a JSON object with HTTP status code 200 (OK) if the category is found.
         An error message as a JSON object with HTTP status code 404 (Not Found) if the category is not found.
     """
-    stmt = db.select(Category).filter_by(id=id)
+    # Only dump (and select) the fields asked for with ?fields=
+    schema = select_fields(category_schema)
+    stmt = eager_load(db.select(Category).filter_by(id=id), Category, schema)
     category = db.session.scalar(stmt)
     if category:
-        return category_schema.dump(category)
+        return dump(schema, category)
     else:
         # Return an error message if the input ID is not found
         return {'Error': f'Category not found with the id {id}'}, 404
@@ -77,9 +106,33 @@ def create_category():
     # Add the category to the database and commit the changes
     db.session.add(categories)
     db.session.commit()
+    cache.invalidate('category')
     return category_schema.dump(categories), 201
 
 
+@category_bp.route('/import', methods=['POST'])
+@jwt_required()
+@authorise_admin
+def import_categories():
+    """
+    Route for bulk importing categories.
+
+    This route allows admins to create many categories at once by sending a JSON Lines
+    or CSV file as the request body. Rows are validated and inserted in batches,
+    and rows with errors are skipped and reported instead of stopping the import.
+
+    Returns:
+        The number of categories imported and a list of per-row errors with HTTP status code 201 (Created).
+
+        An error message as a JSON object with HTTP status code 400 (Bad Request)
+        if no rows could be imported or the format is not supported.
+
+        An error message as a JSON object with HTTP status code 403 (Forbidden)
+        if the current user is not an admin.
+    """
+    return import_request('categories')
+
+
 @category_bp.route('/<int:id>', methods=['DELETE'])
 @jwt_required()
 @authorise_admin
@@ -104,8 +157,11 @@ def delete_one_category(id):
     category = db.session.scalar(stmt)
 
     if category:
-        db.session.delete(category)
+        # Soft deleted with its content, the rows are purged later in small batches
+        category.deleted_at = db.func.now()
+        soft_delete_content_where(Content.category_id == id)
         db.session.commit()
+        cache.invalidate('content', 'reviews', 'author', 'category')
         return {'Message': f'Category {category} has been deleted successfully.'}
     else: 
         # Return an error message if the input ID is not found
@@ -140,6 +196,7 @@ def update_one_category(id):
         category.category = json_data.get('category', category.category)
 
         db.session.commit()
+        cache.invalidate('category')
         # Return the updated category as JSON with HTTP status code 200 (OK), if id doesn't exist return error
         return category_schema.dump(category)
     else:
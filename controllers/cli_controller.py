@@ -1,11 +1,18 @@
-from flask import Blueprint
-from init import db, bcrypt
+from flask import Blueprint, current_app
+import click
+from init import db, bcrypt, cache
 from datetime import date, datetime
 from models.user import User
 from models.content import Content
 from models.review import Review
 from models.category import Category
 from models.author import Author
+from utils.ratings import rebuild_ratings
+from utils.migrate import upgrade_schema
+from utils.search import create_search_index, drop_search_index, rebuild_search_index
+from utils.purge import purge_deleted
+from utils.bulk_import import IMPORTERS, IMPORT_FORMATS, DEFAULT_BATCH_SIZE, import_stream
+from utils import seed_large
 
 
 db_commands = Blueprint('db', __name__)
@@ -25,9 +32,32 @@ def create_db():
         Prints "Tables Created" upon successful creation of the tables.
     """
     db.create_all()
+    create_search_index()
     print("Tables Created")
 
 
+@db_commands.cli.command('upgrade')
+def upgrade_db():
+    """
+    Command for upgrading an existing database to match the models.
+
+    Unlike create, this can be run against a database that already has data.
+    It creates any missing tables and adds any missing columns and indexes, and never
+    drops or rebuilds a table. On PostgreSQL the indexes are built
+    concurrently so reads and writes can carry on while it runs.
+
+    Usage:
+        flask db upgrade
+
+    Returns:
+        Prints each table, column and index that was created.
+    """
+    created = upgrade_schema()
+    for name in created:
+        print(f"Created {name}")
+    print("Database up to date")
+
+
 @db_commands.cli.command('drop')
 def drop_db():
     """
@@ -42,10 +72,134 @@ def drop_db():
     Returns:
         Prints "Tables dropped" upon successful dropping of the tables.
     """
+    drop_search_index()
     db.drop_all()
     print("Tables dropped")
 
 
+@db_commands.cli.command('revoke-admin')
+@click.argument('email')
+def revoke_admin(email):
+    """
+    Command for removing admin status from a user.
+
+    Tokens carry the admin flag as a claim, which admin routes trust for
+    ADMIN_CLAIM_TTL seconds after login. Once that has passed the database
+    is checked again, so the user loses admin access within the TTL even if
+    they still hold an old token.
+
+    Usage:
+        flask db revoke-admin admin@main.com
+
+    Returns:
+        Prints a message confirming the change, or an error if the user does not exist.
+    """
+    stmt = db.select(User).filter_by(email=email)
+    user = db.session.scalar(stmt)
+    if not user:
+        print(f"User with email {email} does not exist")
+        return
+
+    user.is_admin = False
+    db.session.commit()
+    print(f"Admin status revoked for {email}")
+
+
+@db_commands.cli.command('import')
+@click.argument('kind', type=click.Choice(list(IMPORTERS)))
+@click.argument('file', type=click.File('rb'))
+@click.option('--format', 'file_format', type=click.Choice(IMPORT_FORMATS),
+              help='File format, worked out from the file extension if not given.')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True,
+              help='Number of rows validated and inserted together.')
+def import_db(kind, file, file_format, batch_size):
+    """
+    Command for bulk importing content, authors or categories from a file.
+
+    The file is read as a stream in JSON Lines or CSV format and inserted in
+    batches. Rows with errors are skipped and printed with their row number.
+
+    Usage:
+        flask db import content catalogue.jsonl
+        flask db import authors authors.csv --batch-size 5000
+
+    Returns:
+        Prints the number of rows imported and any per-row errors.
+    """
+    if file_format is None:
+        file_format = 'csv' if file.name.endswith('.csv') else 'jsonl'
+
+    result = import_stream(kind, file, file_format, batch_size)
+    for error in result['errors']:
+        print(f"Row {error['row']}: {error['Error']}")
+    print(f"Imported {result['imported']} {kind}, {len(result['errors'])} rows with errors")
+
+
+@db_commands.cli.command('rebuild-ratings')
+def rebuild_ratings_db():
+    """
+    Command for rebuilding the content rating summaries.
+
+    The summaries are normally updated as reviews are created, changed and
+    deleted. This recalculates all of them from the reviews table to fix any
+    drift, for example after reviews were changed outside the API.
+
+    Usage:
+        flask db rebuild-ratings
+
+    Returns:
+        Prints the number of content items with a rating summary.
+    """
+    total = rebuild_ratings()
+    cache.invalidate('content')
+    print(f"Rebuilt ratings for {total} content items")
+
+
+@db_commands.cli.command('reindex-search')
+def reindex_search_db():
+    """
+    Command for rebuilding the content search index.
+
+    The index is normally updated as content is created, changed and deleted.
+    This rebuilds it from the content table, for example after upgrading an
+    existing database or if content was changed outside the API.
+
+    Usage:
+        flask db reindex-search
+
+    Returns:
+        Prints the number of content items indexed.
+    """
+    total = rebuild_search_index()
+    cache.invalidate('content')
+    print(f"Indexed {total} content items")
+
+
+@db_commands.cli.command('purge')
+@click.option('--batch-size', type=int, help='Most rows deleted in one transaction, PURGE_BATCH_SIZE if not given.')
+@click.option('--pause', type=float, help='Seconds to wait between batches, PURGE_PAUSE if not given.')
+def purge_db(batch_size, pause):
+    """
+    Command for permanently deleting soft deleted rows.
+
+    Deleting content, authors, categories and reviews through the API only
+    marks them as deleted. This removes the marked rows, and the reviews of
+    deleted content, in small batches with a pause between them so it can
+    run alongside live traffic, e.g. from cron.
+
+    Usage:
+        flask db purge
+        flask db purge --batch-size 500 --pause 1
+
+    Returns:
+        Prints the number of rows deleted from each table.
+    """
+    config = current_app.config
+    counts = purge_deleted(batch_size or config['PURGE_BATCH_SIZE'],
+                           config['PURGE_PAUSE'] if pause is None else pause)
+    print("Purged " + ", ".join(f"{count} {name}" for name, count in counts.items()))
+
+
 # The command for seeding the objects
 @db_commands.cli.command('seed')
 def seed_db():
@@ -234,4 +388,37 @@ def seed_db():
     db.session.add_all(reviews)
     db.session.commit()
 
+    # Build the rating summaries and search index for the seeded data
+    rebuild_ratings()
+    rebuild_search_index()
+
     print("Tables seeded")
+
+
+@db_commands.cli.command('seed-large')
+@click.option('--users', default=1000, show_default=True, help='Users to generate.')
+@click.option('--content', default=10000, show_default=True, help='Content items to generate.')
+@click.option('--reviews', default=100000, show_default=True, help='Reviews to generate.')
+@click.option('--authors', type=int, help='Authors to generate, one per 20 content items if not given.')
+@click.option('--categories', type=int, help='Categories to generate, the ones from `flask db seed` that are missing if not given.')
+@click.option('--batch-size', default=seed_large.DEFAULT_BATCH_SIZE, show_default=True,
+              help='Number of rows inserted together.')
+@click.option('--seed', 'random_seed', type=int, help='Random seed, the same seed generates the same data.')
+def seed_large_db(users, content, reviews, authors, categories, batch_size, random_seed):
+    """
+    Command for seeding the database with a large amount of synthetic data.
+
+    The rows are added to the existing data, so this can run after
+    `flask db seed` or on its own after `flask db create`. Used for measuring
+    how the application performs and scales with realistic amounts of data.
+    Every generated user can log in with the password "password1".
+
+    Usage:
+        flask db seed-large --users 10000 --content 100000 --reviews 1000000
+
+    Returns:
+        Prints the number of rows added to each table.
+    """
+    print(f"Seeding {users} users, {content} content items and {reviews} reviews...")
+    counts = seed_large.seed_large(users, content, reviews, authors, categories, batch_size, random_seed)
+    print("Tables seeded with " + ", ".join(f"{count} {table}" for table, count in counts.items()))
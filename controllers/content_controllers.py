@@ -1,32 +1,139 @@
 from flask import Blueprint, request, jsonify
-from init import db, ma
+from init import db, ma, cache
 from models.content import Content, content_schema, contents_schema
 from models.author import Author
 from models.category import Category
+from models.content_rating import ContentRating, content_rating_schema, content_ratings_schema
+from models.review import Review, content_reviews_schema
 from flask_jwt_extended import jwt_required
 from controllers.author_controller import authorise_admin
+from utils.query import eager_load, select_fields, ids_arg, load_by_ids, batch_response, paginate, paginate_sorted, sort_order, page_headers, int_arg, date_arg, float_arg, MAX_PAGE_SIZE, DEFAULT_PAGE_SIZE
+from utils.streaming import wants_stream, stream_response
+from utils.serializers import dump
+from utils.async_db import async_read
+from utils.bulk_import import import_request
+from utils.search import search_content, index_content
+from utils.deletes import soft_delete_content_where
 from datetime import datetime
 
 
 # Blueprint for content routes
 content_bp = Blueprint('content', __name__, url_prefix='/content')
 
+# Sort keys for the content list: column to sort by and whether it is highest first
+CONTENT_SORTS = {
+    'newest': (Content.id, True),
+    'oldest': (Content.id, False),
+    'published': (Content.published, True),
+    'title': (Content.title, False),
+    'rating': (ContentRating.rating_average, True),
+}
+
+# Sort keys for a content item's reviews: column to sort by and whether it is highest first
+REVIEW_SORTS = {
+    'newest': (Review.created, True),
+    'highest': (Review.rating, True),
+    'lowest': (Review.rating, False),
+}
+
+
+def filter_content(stmt):
+    """
+    Add the filters from the query string to a content select statement.
+
+    Every filter becomes part of the WHERE clause, so only matching rows are
+    read from the database. Filters: genre, category_id, author_id, publisher,
+    published_from, published_to (YYYY-MM-DD, inclusive) and min_rating.
+
+    Returns:
+        The filtered statement.
+    """
+    genre = request.args.get('genre')
+    publisher = request.args.get('publisher')
+    category_id = int_arg('category_id')
+    author_id = int_arg('author_id')
+    published_from = date_arg('published_from')
+    published_to = date_arg('published_to')
+    min_rating = float_arg('min_rating')
+
+    if genre:
+        stmt = stmt.where(Content.genre == genre)
+    if publisher:
+        stmt = stmt.where(Content.publisher == publisher)
+    if category_id is not None:
+        stmt = stmt.where(Content.category_id == category_id)
+    if author_id is not None:
+        stmt = stmt.where(Content.author_id == author_id)
+    if published_from:
+        stmt = stmt.where(Content.published >= published_from)
+    if published_to:
+        stmt = stmt.where(Content.published <= published_to)
+    if min_rating is not None:
+        stmt = stmt.where(ContentRating.rating_average >= min_rating)
+    return stmt
+
+
 @content_bp.route('/')
+@async_read
+@cache.cached('content')
 def get_all_content():
     """
     Route for retrieving all content.
 
     This route retrieves a list of all content from the database and returns it as JSON.
+    Results can be filtered with genre, category_id, author_id, publisher, published_from,
+    published_to and min_rating, and sorted with ?sort= newest (default), oldest, published,
+    title or rating. Filtering and sorting are done in the SQL query.
+    Results are paginated using ?limit= (default 50, max 500) and ?after_id= for the newest
+    sort, or ?after= for the other sorts.
+    ?stream=json or ?stream=ndjson streams every row in chunks instead of returning one page.
+    ?ids=1,2,3 returns just those contents in the order given, with an error object for any id not found.
+    ?fields= (e.g. ?fields=id,title) limits the fields returned and the columns selected.
 
     Returns:
-        A list of all content as JSON objects with HTTP status code 200 (OK).
+        A page of content as JSON objects with HTTP status code 200 (OK).
+        The X-Next-Cursor and Link headers give the cursor for the next page, if there is one.
+        An error message with HTTP status code 400 (Bad Request) if a filter, sort or cursor is invalid.
     """
-    stmt = db.select(Content).order_by(Content.id.desc())
-    contents = db.session.scalars(stmt)
-    return contents_schema.dump(contents)
+    # Only dump (and select) the fields asked for with ?fields=
+    schema = select_fields(contents_schema)
+    # ?ids=1,2,3 fetches just those contents, in that order, with one query
+    ids = ids_arg()
+    if ids is not None:
+        return batch_response(Content, schema, ids, 'Content')
+    sort = request.args.get('sort', 'newest')
+    if sort not in CONTENT_SORTS:
+        return {'Error': f'sort must be one of: {", ".join(CONTENT_SORTS)}.'}, 400
+    sort_column, descending = CONTENT_SORTS[sort]
+
+    stmt = db.select(Content)
+    # The rating lives in the summary table, only join it when it is needed
+    if sort == 'rating' or request.args.get('min_rating'):
+        stmt = stmt.outerjoin(ContentRating, ContentRating.content_id == Content.id)
+    stmt = eager_load(filter_content(stmt), Content, schema)
+
+    if sort == 'newest':
+        stmt = stmt.order_by(Content.id.desc())
+        # Large exports can be streamed in chunks instead of paged
+        if wants_stream():
+            return stream_response(stmt, Content.id, schema)
+        # Return one page at a time, the next page starts after the last id on this one
+        contents, next_cursor = paginate(stmt, Content.id)
+        return dump(schema, contents), 200, page_headers(next_cursor)
+
+    if wants_stream():
+        if request.args.get('after_id'):
+            return {'Error': 'after_id can only be used with sort=newest.'}, 400
+        stmt = stmt.order_by(*sort_order(sort_column, Content.id, descending))
+        return stream_response(stmt, Content.id, schema)
+
+    contents, next_cursor = paginate_sorted(stmt, sort_column, Content.id, descending)
+    return dump(schema, contents), 200, page_headers(next_cursor, param='after')
 
 
 @content_bp.route('/<int:id>')
+@async_read
+@cache.cached('content')
 def get_one_content(id):
     """
     Route for retrieving a single piece of content by the ID.
@@ -35,20 +142,149 @@ def get_one_content(id):
 
     Parameters:
         id (int): The ID of the content to retrieve.
+    ?fields= (e.g. ?fields=id,title) limits the fields returned and the columns selected.
 
     Returns:
         The content data as a JSON object with HTTP status code 200 (OK) if the content is found.
         An error message as a JSON object with HTTP status code 404 (Not Found) if the content is not found.
     """
-    stmt = db.select(Content).filter_by(id=id)
+    # Only dump (and select) the fields asked for with ?fields=
+    schema = select_fields(content_schema)
+    stmt = eager_load(db.select(Content).filter_by(id=id), Content, schema)
     content = db.session.scalar(stmt)
     if content:
-        return content_schema.dump(content)
+        return dump(schema, content)
     else:
         # Return an error message if the input ID is not found
         return {'Error': f'Content not found with the id {id}'}, 404
     
 
+@content_bp.route('/search')
+@cache.cached('content')
+def search_all_content():
+    """
+    Route for searching content.
+
+    This route finds content whose title, description, genre or author name
+    matches every word in ?q=, using the full-text search index. Results are
+    ranked with title matches first and paginated with ?limit= (default 50,
+    max 500) and ?page= (starting at 1).
+    ?fields= (e.g. ?fields=id,title) limits the fields returned and the columns selected.
+
+    Returns:
+        A page of matching content as JSON objects, best match first, with HTTP status code 200 (OK).
+        The Link header points to the next page, if there might be one.
+        An error message as a JSON object with HTTP status code 400 (Bad Request) if q is missing.
+    """
+    # Only dump (and select) the fields asked for with ?fields=
+    schema = select_fields(contents_schema)
+    q = request.args.get('q', '').strip()
+    if not q:
+        return {'Error': 'A search must be provided with ?q=.'}, 400
+    limit = min(int_arg('limit', DEFAULT_PAGE_SIZE, minimum=1), MAX_PAGE_SIZE)
+    page = int_arg('page', 1, minimum=1)
+
+    ids = search_content(q, limit, (page - 1) * limit)
+    # Put the rows back in ranked order
+    contents = load_by_ids(Content, schema, ids)
+    results = [contents[id] for id in ids if id in contents]
+
+    next_page = page + 1 if len(ids) == limit else None
+    return dump(schema, results), 200, page_headers(next_page, param='page')
+
+
+@content_bp.route('/<int:id>/stats')
+@cache.cached('content')
+def get_content_stats(id):
+    """
+    Route for retrieving the rating summary of a single piece of content.
+
+    The review count, rating sum, average and a histogram of ratings are read
+    from the precomputed summary, so no reviews are scanned.
+
+    Parameters:
+        id (int): The ID of the content.
+
+    Returns:
+        The rating summary as a JSON object with HTTP status code 200 (OK) if the content is found.
+        An error message as a JSON object with HTTP status code 404 (Not Found) if the content is not found.
+    """
+    content = db.session.get(Content, id)
+    if not content:
+        return {'Error': f'Content not found with the id {id}'}, 404
+
+    # Content without any reviews has no summary row yet
+    rating = content.rating or ContentRating(content_id=id, review_count=0, rating_sum=0, histogram={})
+    return dump(content_rating_schema, rating)
+
+
+@content_bp.route('/<int:id>/reviews')
+@async_read
+@cache.cached('reviews')
+def get_content_reviews(id):
+    """
+    Route for retrieving the reviews of a single piece of content.
+
+    This route retrieves one content item's reviews with each reviewer's name,
+    sorted with ?sort= newest (default), highest or lowest rating. Filtering on
+    content_id and sorting by date or rating matches the (content_id, created, id)
+    and (content_id, rating, id) indexes, and the reviewers are loaded in the same
+    query, so a page costs the same however many reviews there are.
+    Results are paginated using ?limit= (default 50, max 500) and ?after=.
+    ?fields= (e.g. ?fields=id,rating) limits the fields returned and the columns selected.
+
+    Parameters:
+        id (int): The ID of the content.
+
+    Returns:
+        A page of the content's reviews as JSON objects with HTTP status code 200 (OK).
+        The X-Next-Cursor and Link headers give the cursor for the next page, if there is one.
+        An error message with HTTP status code 400 (Bad Request) if the sort or cursor is invalid.
+        An error message as a JSON object with HTTP status code 404 (Not Found) if the content is not found.
+    """
+    # Only dump (and select) the fields asked for with ?fields=
+    schema = select_fields(content_reviews_schema)
+    sort = request.args.get('sort', 'newest')
+    if sort not in REVIEW_SORTS:
+        return {'Error': f'sort must be one of: {", ".join(REVIEW_SORTS)}.'}, 400
+    sort_column, descending = REVIEW_SORTS[sort]
+
+    stmt = eager_load(db.select(Review).where(Review.content_id == id), Review, schema)
+    reviews, next_cursor = paginate_sorted(stmt, sort_column, Review.id, descending)
+    # Only an empty first page needs the extra query to tell content with no reviews from missing content
+    if not reviews and not request.args.get('after') and not db.session.scalar(db.select(Content.id).filter_by(id=id)):
+        return {'Error': f'Content not found with the id {id}'}, 404
+    return dump(schema, reviews), 200, page_headers(next_cursor, param='after')
+
+
+@content_bp.route('/top-rated')
+@cache.cached('content')
+def get_top_rated_content():
+    """
+    Route for retrieving the highest rated content.
+
+    This route reads the precomputed rating summaries ordered by average rating,
+    using the index on rating_average. ?limit= sets how many are returned
+    (default 50, max 500) and ?min_reviews= leaves out content with fewer reviews.
+
+    Returns:
+        A list of rating summaries with their content as JSON objects with HTTP status code 200 (OK).
+    """
+    limit = min(int_arg('limit', DEFAULT_PAGE_SIZE, minimum=1), MAX_PAGE_SIZE)
+    min_reviews = int_arg('min_reviews', 1, minimum=1)
+
+    stmt = (
+        db.select(ContentRating)
+        # Joined so the summaries of deleted content are left out with it
+        .join(ContentRating.content)
+        .where(ContentRating.review_count >= min_reviews)
+        .order_by(ContentRating.rating_average.desc(), ContentRating.content_id.desc())
+        .limit(limit)
+    )
+    ratings = db.session.scalars(eager_load(stmt, ContentRating, content_ratings_schema))
+    return dump(content_ratings_schema, ratings)
+
+
 @content_bp.route('/', methods=['POST'])
 @jwt_required()
 @authorise_admin
@@ -116,10 +352,38 @@ def create_content():
 
     # Add the content to the database and commit the changes
     db.session.add(content)
+    # Flush to get the new id, then index it in the same transaction
+    db.session.flush()
+    index_content([content.id])
     db.session.commit()
+    # Content is nested in reviews, authors and categories, so all of them are refreshed
+    cache.invalidate('content', 'reviews', 'author', 'category')
     return content_schema.dump(content), 201
 
 
+@content_bp.route('/import', methods=['POST'])
+@jwt_required()
+@authorise_admin
+def import_content():
+    """
+    Route for bulk importing content.
+
+    This route allows admins to create many content at once by sending a JSON Lines
+    or CSV file as the request body. Rows are validated and inserted in batches,
+    and rows with errors are skipped and reported instead of stopping the import.
+
+    Returns:
+        The number of content imported and a list of per-row errors with HTTP status code 201 (Created).
+
+        An error message as a JSON object with HTTP status code 400 (Bad Request)
+        if no rows could be imported or the format is not supported.
+
+        An error message as a JSON object with HTTP status code 403 (Forbidden)
+        if the current user is not an admin.
+    """
+    return import_request('content')
+
+
 @content_bp.route('/<int:id>', methods=['DELETE'])
 @jwt_required()
 @authorise_admin
@@ -146,10 +410,11 @@ def delete_one_content(id):
     stmt = db.select(Content).filter_by(id=id)
     content = db.session.scalar(stmt)
 
-    # If content item exists, delete it from the database and commit the changes, if not return error message
+    # If content item exists, soft delete it (its reviews are hidden with it and purged later) and commit the changes, if not return error message
     if content:
-        db.session.delete(content)
+        soft_delete_content_where(Content.id == id)
         db.session.commit()
+        cache.invalidate('content', 'reviews', 'author', 'category')
         return {'Message': f'Content {content.title} has been deleted successfully.'}
     else: 
         return {'Error': f'Content with the id {id} does not exist.'}, 404
@@ -217,6 +482,8 @@ def update_one_content(id):
     content.category = category
     content.author = author
 
+    index_content([content.id])
     db.session.commit()
+    cache.invalidate('content', 'reviews', 'author', 'category')
     return content_schema.jsonify(content)
 
@@ -0,0 +1,90 @@
+from flask import Blueprint, current_app
+from flask_jwt_extended import jwt_required
+from controllers.author_controller import authorise_admin
+from init import db, sql_metrics, replicas
+from utils.passwords import hash_metrics
+from utils.db_pool import pool_metrics
+
+
+# Blueprint for internal metrics routes
+metrics_bp = Blueprint('metrics', __name__, url_prefix='/metrics')
+
+
+@metrics_bp.route('/passwords')
+@jwt_required()
+@authorise_admin
+def get_password_metrics():
+    """
+    Route for retrieving password hashing metrics.
+
+    This route returns how many passwords this worker process has hashed and
+    checked, and the average and max time each took. Only admins can view it.
+
+    Returns:
+        The hashing metrics as a JSON object with HTTP status code 200 (OK).
+    """
+    return hash_metrics()
+
+
+@metrics_bp.route('/db-pool')
+@jwt_required()
+@authorise_admin
+def get_db_pool_metrics():
+    """
+    Route for retrieving database connection pool metrics.
+
+    This route returns, for each of this worker process' engines, the pool
+    size, how many connections are checked out and idle, how much overflow is
+    in use, and how long checkouts have waited for a connection. The primary
+    engine is always there, the async read path's engine when the app is
+    served with asgi.py, and one entry per read replica (with the replicas'
+    asyncio engines under async_replicas). Only admins can view it.
+
+    Returns:
+        The pool metrics of each engine as a JSON object with HTTP status code 200 (OK).
+    """
+    metrics = {'primary': pool_metrics(db.engine)}
+    if 'async_read_engine' in current_app.extensions:
+        metrics['async'] = pool_metrics(current_app.extensions['async_read_engine'])
+    metrics['replicas'] = {replica.url: pool_metrics(replica.engine) for replica in replicas.replicas}
+    async_replicas = [replica for replica in replicas.replicas if replica.async_engine is not None]
+    if async_replicas:
+        metrics['async_replicas'] = {replica.url: pool_metrics(replica.async_engine) for replica in async_replicas}
+    return metrics
+
+
+@metrics_bp.route('/sql')
+@jwt_required()
+@authorise_admin
+def get_sql_metrics():
+    """
+    Route for retrieving per route SQL metrics.
+
+    This route returns, for every route this worker process has served, how
+    many requests it has seen, the average and max number of queries, the
+    average time spent in the database, and whether its query count grows
+    with the number of items it returns. Metrics are only collected when
+    SQL_INSTRUMENTATION is on. Only admins can view it.
+
+    Returns:
+        The SQL metrics as a JSON object with HTTP status code 200 (OK).
+    """
+    return sql_metrics.metrics()
+
+
+@metrics_bp.route('/replicas')
+@jwt_required()
+@authorise_admin
+def get_replica_metrics():
+    """
+    Route for retrieving read replica health.
+
+    This route returns every read replica this worker process sends GET queries
+    to, whether its last health check passed, how far behind the primary it
+    was, the last error, how many requests it has served and its pool status.
+    Only admins can view it.
+
+    Returns:
+        The replica health as a JSON object with HTTP status code 200 (OK).
+    """
+    return replicas.metrics()
@@ -1,10 +1,23 @@
 from flask import Blueprint, request
-from init import db, bcrypt
+from init import db, bcrypt, cache
 from datetime import date
 from models.review import Review, review_schema, reviews_schema
 from models.content import Content
 from flask_jwt_extended import get_jwt_identity, jwt_required
 from models.user import User
+from utils.ratings import update_rating
+from utils.query import eager_load, select_fields, ids_arg, batch_response, paginate, page_headers
+from utils.streaming import wants_stream, stream_response
+from utils.serializers import dump
+from utils.async_db import async_read
+from utils.bulk_import import create_reviews, MAX_BATCH_REVIEWS
+
+def is_rating(value):
+    """
+    Check a rating from the request JSON is a whole number (true and false don't count).
+    """
+    return type(value) is int
+
 
 def authorize_user():
     """
@@ -25,21 +38,43 @@ reviews_bp = Blueprint('reviews', __name__, url_prefix='/reviews')
 
 
 @reviews_bp.route('/')
+@async_read
+@cache.cached('reviews')
 def get_all_reviews():
     """
     Route for retrieving all reviews.
 
     This route retrieves a list of all reviews from the database and returns it as JSON.
+    Results are paginated newest first using ?limit= (default 50, max 500) and ?after_id=.
+    ?stream=json or ?stream=ndjson streams every row in chunks instead of returning one page.
+    ?ids=1,2,3 returns just those reviews in the order given, with an error object for any id not found.
+    ?fields= (e.g. ?fields=id,rating) limits the fields returned and the columns selected.
 
     Returns:
-        A list of all reviews as JSON objects with HTTP status code 200 (OK).
+        A page of reviews as JSON objects with HTTP status code 200 (OK).
+        The X-Next-Cursor and Link headers give the after_id for the next page, if there is one.
+        An error message with HTTP status code 400 (Bad Request) if limit or after_id is invalid.
     """
-    stmt = db.select(Review).order_by(Review.id.desc())
-    reviews = db.session.scalars(stmt)
-    return reviews_schema.dump(reviews)
+    # Only dump (and select) the fields asked for with ?fields=
+    schema = select_fields(reviews_schema)
+    # ?ids=1,2,3 fetches just those reviews, in that order, with one query
+    ids = ids_arg()
+    if ids is not None:
+        return batch_response(Review, schema, ids, 'Review')
+    # Load each review's user and content up front instead of once per row
+    stmt = eager_load(db.select(Review).order_by(Review.id.desc()), Review, schema)
+    # Large exports can be streamed in chunks instead of paged
+    if wants_stream():
+        return stream_response(stmt, Review.id, schema)
+
+    # Return one page at a time, the next page starts after the last id on this one
+    reviews, next_cursor = paginate(stmt, Review.id)
+    return dump(schema, reviews), 200, page_headers(next_cursor)
 
 
 @reviews_bp.route('/<int:id>')
+@async_read
+@cache.cached('reviews')
 def get_one_review(id):
     """
     Route for retrieving a single review by the ID.
@@ -48,15 +83,18 @@ def get_one_review(id):
 
     Parameters:
         id (int): The ID of the review to retrieve.
+    ?fields= (e.g. ?fields=id,rating) limits the fields returned and the columns selected.
 
     Returns:
         The review data as a JSON object with HTTP status code 200 (OK) if the review is found.
         An error message as a JSON object with HTTP status code 404 (Not Found) if the review is not found.
     """
-    stmt = db.select(Review).filter_by(id=id)
+    # Only dump (and select) the fields asked for with ?fields=
+    schema = select_fields(review_schema)
+    stmt = eager_load(db.select(Review).filter_by(id=id), Review, schema)
     review = db.session.scalar(stmt)
     if review:
-        return review_schema.dump(review)
+        return dump(schema, review)
     else:
         # Return an error message if the input ID is not found
         return {'Error': f'Review not found with the id {id}'}, 404
@@ -79,13 +117,16 @@ def create_review():
         if the content_id doesn't exist. 
 
         An error message as a JSON object with HTTP status code 400 (Bad Request) 
-        if the request JSON is missing required content_id.
+        if the request JSON is missing required content_id, or the rating isn't a whole number.
     """
     body_data = request.get_json()
     content_id = body_data.get('content_id')
     # Return an error message if content_id is not provided.
     if not content_id:
         return {'Error': 'content_id must be provided when creating a review.'}, 400
+    # Checked here because the rating summary adds the rating up before the INSERT would reject it
+    if not is_rating(body_data.get('rating')):
+        return {'Error': 'rating must be provided as a whole number.'}, 400
 
     content = Content.query.get(content_id)
     # Return an error message if the content with the specified content_id does not exist
@@ -102,11 +143,49 @@ def create_review():
     )
 
     db.session.add(review)
+    # Keep the content's rating summary in step with its reviews
+    update_rating(content_id, added=review.rating)
     db.session.commit()
+    # The content's rating stats change along with its reviews
+    cache.invalidate('reviews', 'content')
     # Return the created review as JSON with HTTP status code 201 (Created)
     return review_schema.dump(review), 201
 
 
+@reviews_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def create_review_batch():
+    """
+    Route for creating many reviews at once.
+
+    This route allows users to create up to MAX_BATCH_REVIEWS reviews with one
+    request by sending a JSON array of reviews, each with content_id, rating and
+    comment. All the content_ids are checked with one query and the reviews are
+    inserted together in a single transaction. Reviews with errors are skipped
+    and reported instead of stopping the rest.
+
+    Returns:
+        The number of reviews created and a result for each review in the order
+        sent (its new id, or an error message) with HTTP status code 201 (Created).
+
+        The results with HTTP status code 400 (Bad Request) if no reviews could
+        be created.
+
+        An error message as a JSON object with HTTP status code 400 (Bad Request)
+        if the request JSON is not a list or has too many reviews.
+    """
+    items = request.get_json()
+    if not isinstance(items, list):
+        return {'Error': 'The request body must be a JSON array of reviews.'}, 400
+    if len(items) > MAX_BATCH_REVIEWS:
+        return {'Error': f'At most {MAX_BATCH_REVIEWS} reviews can be created at once.'}, 400
+
+    result = create_reviews(items, get_jwt_identity())
+    if not result['created']:
+        return result, 400
+    return result, 201
+
+
 @reviews_bp.route('/<int:id>', methods=['DELETE'])
 @jwt_required()
 def delete_one_review(id):
@@ -135,8 +214,11 @@ def delete_one_review(id):
     if review:
         # Check if the current user is the owner of the review, if true delete
         if str(review.user_id) == str(current_user_id):
-            db.session.delete(review)
+            # Soft deleted, the row is purged later
+            review.deleted_at = db.func.now()
+            update_rating(review.content_id, removed=review.rating)
             db.session.commit()
+            cache.invalidate('reviews', 'content')
             return {'Message': f'Review has been deleted successfully'}
         # Return error message if current user is not owner
         else:
@@ -167,8 +249,13 @@ def update_one_review(id):
 
         An error message as a JSON object with HTTP status code 404 (Not Found) 
         if the review with the specified ID does not exist.
+
+        An error message as a JSON object with HTTP status code 400 (Bad Request) 
+        if the rating isn't a whole number.
     """
     body_data = request.get_json()
+    if body_data.get('rating') and not is_rating(body_data['rating']):
+        return {'Error': 'rating must be a whole number.'}, 400
     # Retrieve the review from the database based on the provided ID
     stmt = db.select(Review).filter_by(id=id)
     review = db.session.scalar(stmt)
@@ -178,10 +265,14 @@ def update_one_review(id):
         if str(review.user_id) != get_jwt_identity():
             return {'Error': 'You must be the owner of this review to edit.'}, 403
         # Update rating and comment if provided in the request JSON, if not provided draw from database
+        old_rating = review.rating
         review.rating = body_data.get('rating') or review.rating
         review.comment = body_data.get('comment') or review.comment
 
+        if str(review.rating) != str(old_rating):
+            update_rating(review.content_id, added=review.rating, removed=old_rating)
         db.session.commit()
+        cache.invalidate('reviews', 'content')
         return review_schema.dump(review)
     else:
         # Return an error message if the review with the specified ID does not exist
@@ -0,0 +1,77 @@
+from flask import Blueprint
+from init import db, cache
+from models.review import Review, user_reviews_schema
+from models.user import User
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from utils.query import eager_load, select_fields, paginate, page_headers, int_arg
+from utils.serializers import dump
+from utils.async_db import async_read
+
+
+# Blueprint for user routes
+users_bp = Blueprint('users', __name__, url_prefix='/users')
+
+
+def user_reviews_page(user_id):
+    """
+    Read one page of a user's reviews, newest first, with each review's content loaded up front.
+
+    Filtering on user_id and ordering by id matches the ix_reviews_user_id_id
+    index, so the page is read straight from the index and its cost depends on
+    the page size, not on how many reviews there are in total.
+
+    Returns:
+        tuple: The page of reviews and the after_id for the next page, or None.
+    """
+    schema = select_fields(user_reviews_schema)
+    stmt = eager_load(db.select(Review).where(Review.user_id == user_id).order_by(Review.id.desc()), Review, schema)
+    reviews, next_cursor = paginate(stmt, Review.id)
+    return dump(schema, reviews), next_cursor
+
+
+@users_bp.route('/<int:id>/reviews')
+@async_read
+@cache.cached('reviews')
+def get_user_reviews(id):
+    """
+    Route for retrieving a user's reviews.
+
+    This route retrieves the reviews written by one user, newest first, with
+    the content each review is for. Results are paginated using ?limit=
+    (default 50, max 500) and ?after_id=.
+    ?fields= (e.g. ?fields=id,rating) limits the fields returned and the columns selected.
+
+    Parameters:
+        id (int): The ID of the user whose reviews to retrieve.
+
+    Returns:
+        A page of the user's reviews as JSON objects with HTTP status code 200 (OK).
+        The X-Next-Cursor and Link headers give the after_id for the next page, if there is one.
+        An error message as a JSON object with HTTP status code 404 (Not Found) if the user does not exist.
+    """
+    reviews, next_cursor = user_reviews_page(id)
+    # Only an empty first page needs the extra query to tell a user with no reviews from a missing user
+    if not reviews and int_arg('after_id') is None and not db.session.scalar(db.select(User.id).filter_by(id=id)):
+        return {'Error': f'User not found with the id {id}'}, 404
+    return reviews, 200, page_headers(next_cursor)
+
+
+@users_bp.route('/me/reviews')
+@async_read
+@jwt_required()
+def get_my_reviews():
+    """
+    Route for retrieving the current user's reviews.
+
+    This route retrieves the reviews written by the user the JWT token belongs
+    to, newest first, with the content each review is for. Results are paginated
+    using ?limit= (default 50, max 500) and ?after_id=. Responses aren't cached,
+    every user gets their own.
+    ?fields= (e.g. ?fields=id,rating) limits the fields returned and the columns selected.
+
+    Returns:
+        A page of the current user's reviews as JSON objects with HTTP status code 200 (OK).
+        The X-Next-Cursor and Link headers give the after_id for the next page, if there is one.
+    """
+    reviews, next_cursor = user_reviews_page(get_jwt_identity())
+    return reviews, 200, page_headers(next_cursor)
@@ -2,8 +2,15 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
+from utils.cache import ResponseCache
+from utils.sql_metrics import SQLMetrics
+from utils.replicas import ReadReplicas, RoutingSession
 
-db = SQLAlchemy()
+# Reads in GET requests can be sent to a replica, see utils/replicas.py
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 ma = Marshmallow()
 bcrypt = Bcrypt()
-jwt = JWTManager()
\ No newline at end of file
+jwt = JWTManager()
+cache = ResponseCache()
+sql_metrics = SQLMetrics()
+replicas = ReadReplicas()
\ No newline at end of file
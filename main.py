@@ -1,22 +1,60 @@
 from flask import Flask
 import os
-from init import db, ma, bcrypt, jwt
+from init import db, ma, bcrypt, jwt, cache, sql_metrics, replicas
 from controllers.cli_controller import db_commands
 from controllers.auth_controller import auth_bp
 from controllers.content_controllers import content_bp
 from controllers.review_controllers import reviews_bp
 from controllers.category_controller import category_bp
 from controllers.author_controller import author_bp
+from controllers.user_controller import users_bp
+from controllers.metrics_controller import metrics_bp
 from marshmallow.exceptions import ValidationError
 from sqlalchemy.exc import IntegrityError, DataError
+from utils.db_pool import engine_options
+from utils.json_provider import JSONProvider
+from utils.purge import purge_worker
 
 def create_app():
     app = Flask(__name__)
 
+    # Response JSON encoding: auto (orjson if it's installed), orjson or stdlib
+    app.config["JSON_BACKEND"]=os.environ.get("JSON_BACKEND", "auto")
+    app.json = JSONProvider(app)
     app.json.sort_keys = False
 
     app.config["SQLALCHEMY_DATABASE_URI"]=os.environ.get("DATABASE_URL")
+    # Connection pool size, overflow, recycle, pre-ping and statement timeout from the environment
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"]=engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+    # Read replicas for GET requests (comma separated), their health checks and read-your-writes window
+    app.config["DATABASE_REPLICA_URLS"]=[url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+    app.config["REPLICA_HEALTH_INTERVAL"]=float(os.environ.get("REPLICA_HEALTH_INTERVAL", 10))
+    app.config["REPLICA_MAX_LAG"]=float(os.environ.get("REPLICA_MAX_LAG", 30))
+    app.config["REPLICA_READ_YOUR_WRITES"]=float(os.environ.get("REPLICA_READ_YOUR_WRITES", 5))
+    # asyncio driver URL for the async read path (asgi.py), derived from DATABASE_URL when not set
+    app.config["ASYNC_DATABASE_URL"]=os.environ.get("ASYNC_DATABASE_URL")
     app.config["JWT_SECRET_KEY"]=os.environ.get("JWT_SECRET_KEY")
+    # Seconds the is_admin claim in a token is trusted before the database is checked again
+    app.config["ADMIN_CLAIM_TTL"]=int(os.environ.get("ADMIN_CLAIM_TTL", 900))
+    # bcrypt work factor, and the process pool that hashes passwords outside the request thread
+    app.config["BCRYPT_LOG_ROUNDS"]=int(os.environ.get("BCRYPT_LOG_ROUNDS", 12))
+    app.config["PASSWORD_HASH_WORKERS"]=int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+    app.config["PASSWORD_HASH_QUEUE"]=int(os.environ.get("PASSWORD_HASH_QUEUE", 4))
+    app.config["PASSWORD_HASH_TIMEOUT"]=float(os.environ.get("PASSWORD_HASH_TIMEOUT", 5))
+    # Response cache for GET routes: lru (in-process), redis or none
+    app.config["CACHE_BACKEND"]=os.environ.get("CACHE_BACKEND", "lru")
+    app.config["CACHE_SIZE"]=int(os.environ.get("CACHE_SIZE", 1024))
+    app.config["CACHE_TTL"]=int(os.environ.get("CACHE_TTL", 60))
+    app.config["CACHE_REDIS_URL"]=os.environ.get("CACHE_REDIS_URL")
+    # Per-request SQL statement counts and timings, slow query and N+1 warnings
+    app.config["SQL_INSTRUMENTATION"]=os.environ.get("SQL_INSTRUMENTATION", "false").lower() in ("1", "true", "yes")
+    app.config["SQL_SLOW_QUERY_MS"]=float(os.environ.get("SQL_SLOW_QUERY_MS", 100))
+    app.config["SQL_SLOWEST_STATEMENTS"]=int(os.environ.get("SQL_SLOWEST_STATEMENTS", 3))
+    app.config["SQL_REPEAT_THRESHOLD"]=int(os.environ.get("SQL_REPEAT_THRESHOLD", 5))
+    # Purging soft deleted rows: background interval (0 runs only with `flask db purge`), batch size and pause between batches
+    app.config["PURGE_INTERVAL"]=float(os.environ.get("PURGE_INTERVAL", 0))
+    app.config["PURGE_BATCH_SIZE"]=int(os.environ.get("PURGE_BATCH_SIZE", 1000))
+    app.config["PURGE_PAUSE"]=float(os.environ.get("PURGE_PAUSE", 0.5))
 
     @app.errorhandler(ValidationError)
     def validation_error(err):
@@ -30,10 +68,22 @@ def create_app():
     def not_found(err):
         return {'Error': str(err)}, 404
 
+    @app.errorhandler(501)
+    def not_implemented(err):
+        return {'Error': str(err)}, 501
+
+    @app.errorhandler(503)
+    def service_unavailable(err):
+        return {'Error': str(err)}, 503
+
     db.init_app(app)
     ma.init_app(app)
     bcrypt.init_app(app)
     jwt.init_app(app)
+    cache.init_app(app)
+    sql_metrics.init_app(app)
+    replicas.init_app(app)
+    purge_worker.init_app(app)
 
     app.register_blueprint(db_commands)
     app.register_blueprint(auth_bp)
@@ -41,5 +91,7 @@ def create_app():
     app.register_blueprint(reviews_bp)
     app.register_blueprint(category_bp)
     app.register_blueprint(author_bp)
+    app.register_blueprint(users_bp)
+    app.register_blueprint(metrics_bp)
 
     return app
\ No newline at end of file
@@ -1,13 +1,14 @@
 from init import db, ma
 from marshmallow import fields
+from utils.soft_delete import SoftDeleteMixin
 
-class Author(db.Model):
+class Author(SoftDeleteMixin, db.Model):
     __tablename__ = "authors"
 
     id = db.Column(db.Integer, primary_key=True)
     author = db.Column(db.String)
 
-    content = db.relationship('Content', back_populates=('author'))
+    content = db.relationship('Content', back_populates=('author'), cascade='all, delete', passive_deletes=True)
 
 class AuthorSchema(ma.Schema):
     content = fields.Nested('ContentSchema', many=True) 
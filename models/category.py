@@ -1,14 +1,15 @@
 from init import db, ma
 from marshmallow import fields
+from utils.soft_delete import SoftDeleteMixin
 from marshmallow.validate import Length, And, Regexp
 
-class Category(db.Model):
+class Category(SoftDeleteMixin, db.Model):
     __tablename__ = "categories"
 
     id = db.Column(db.Integer, primary_key=True)
     category = db.Column(db.String)
 
-    content = db.relationship('Content', back_populates='category')
+    content = db.relationship('Content', back_populates='category', cascade='all, delete', passive_deletes=True)
 
 class CategorySchema(ma.Schema):
     content = fields.Nested('ContentSchema', many=True) 
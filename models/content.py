@@ -1,24 +1,41 @@
 from init import db, ma
 from marshmallow import fields
 from marshmallow.validate import Length, And, Regexp
+from utils.soft_delete import SoftDeleteMixin
 
 
-class Content(db.Model):
+class Content(SoftDeleteMixin, db.Model):
     __tablename__ = "content"
+    __table_args__ = (
+        # Foreign key lookups, with id so an author's or a category's content can be read newest first
+        db.Index('ix_content_author_id_id', 'author_id', 'id'),
+        db.Index('ix_content_category_id_id', 'category_id', 'id'),
+        # Lookup columns used for filtering and sorting the content list, with id for paging.
+        # published is NOT NULL so sorting by it needs no NULLS LAST and either direction can use its index
+        db.Index('ix_content_genre_id', 'genre', 'id'),
+        db.Index('ix_content_publisher_id', 'publisher', 'id'),
+        db.Index('ix_content_published_id', 'published', 'id'),
+        db.Index('ix_content_title_id', 'title', 'id'),
+        # Only the soft deleted rows, found by the purge
+        db.Index('ix_content_deleted_at', 'deleted_at',
+                 postgresql_where=db.text('deleted_at IS NOT NULL'), sqlite_where=db.text('deleted_at IS NOT NULL')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String)
     genre = db.Column(db.String)
     description = db.Column(db.Text)
-    published = db.Column(db.Date)
+    published = db.Column(db.Date, nullable=False)
     publisher = db.Column(db.String)
 
-    author_id = db.Column(db.Integer, db.ForeignKey('authors.id'), nullable=False)
-    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
+    author_id = db.Column(db.Integer, db.ForeignKey('authors.id', ondelete='CASCADE'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id', ondelete='CASCADE'), nullable=False)
 
-    reviews = db.relationship('Review', back_populates='content', cascade='all, delete')
+    # passive_deletes leaves the children to the database (and utils.deletes) instead of loading them to delete one by one
+    reviews = db.relationship('Review', back_populates='content', cascade='all, delete', passive_deletes=True)
     author = db.relationship('Author', back_populates='content')
     category = db.relationship('Category', back_populates='content')
+    rating = db.relationship('ContentRating', back_populates='content', uselist=False, cascade='all, delete', passive_deletes=True)
 
 class ContentSchema(ma.Schema):
     reviews = fields.Nested('ReviewSchema', exclude=['id'])
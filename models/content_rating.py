@@ -0,0 +1,28 @@
+from init import db, ma
+from marshmallow import fields
+
+class ContentRating(db.Model):
+    __tablename__ = "content_ratings"
+    __table_args__ = (
+        # Sorting and filtering content by rating, with the id to break ties
+        db.Index('ix_content_ratings_rating_average_content_id', 'rating_average', 'content_id'),
+    )
+
+    content_id = db.Column(db.Integer, db.ForeignKey('content.id', ondelete='CASCADE'), primary_key=True)
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_average = db.Column(db.Float)
+    # Number of reviews for each rating, e.g. {"5": 10, "4": 2}
+    histogram = db.Column(db.JSON, nullable=False, default=dict)
+
+    content = db.relationship('Content', back_populates='rating')
+
+class ContentRatingSchema(ma.Schema):
+    content = fields.Nested('ContentSchema')
+
+    class Meta:
+        fields = ('content_id', 'review_count', 'rating_sum', 'rating_average', 'histogram', 'content')
+        ordered = True
+
+content_rating_schema = ContentRatingSchema(exclude=['content'])
+content_ratings_schema = ContentRatingSchema(many=True)
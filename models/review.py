@@ -1,21 +1,39 @@
 from init import db, ma
 from marshmallow import fields
+from utils.soft_delete import SoftDeleteMixin
 
-class Review(db.Model):
+class Review(SoftDeleteMixin, db.Model):
     __tablename__ = "reviews"
+    __table_args__ = (
+        # Foreign key lookups, with id so a user's or a content's reviews can be read newest first
+        db.Index('ix_reviews_user_id_id', 'user_id', 'id'),
+        db.Index('ix_reviews_content_id_id', 'content_id', 'id'),
+        # A content item's reviews sorted by date or rating, see GET /content/<id>/reviews.
+        # created and rating are NOT NULL, so the sort needs no NULLS LAST and either direction can use these
+        db.Index('ix_reviews_content_id_created_id', 'content_id', 'created', 'id'),
+        db.Index('ix_reviews_content_id_rating_id', 'content_id', 'rating', 'id'),
+        # Only the soft deleted rows, found by the purge
+        db.Index('ix_reviews_deleted_at', 'deleted_at',
+                 postgresql_where=db.text('deleted_at IS NOT NULL'), sqlite_where=db.text('deleted_at IS NOT NULL')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     rating = db.Column(db.Integer, nullable=False)
     comment = db.Column(db.Text)
-    created = db.Column(db.Date)
+    created = db.Column(db.Date, nullable=False)
 
 
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    content_id = db.Column(db.Integer, db.ForeignKey('content.id'), nullable=False)
+    content_id = db.Column(db.Integer, db.ForeignKey('content.id', ondelete='CASCADE'), nullable=False)
 
     user = db.relationship('User', back_populates='reviews')
     content = db.relationship('Content', back_populates='reviews')
 
+    @classmethod
+    def not_deleted(cls):
+        # Deleting content only marks the content row, its reviews are hidden through it until they are purged
+        return db.and_(cls.deleted_at.is_(None), cls.content.has(deleted_at=None))
+
 class ReviewSchema(ma.Schema):
     user = fields.Nested('UserSchema', only=['first_name', 'last_name'])
     content = fields.Nested('ContentSchema')
@@ -27,4 +45,7 @@ class ReviewSchema(ma.Schema):
 
 review_schema = ReviewSchema()
 reviews_schema = ReviewSchema(many=True)
-
+# A user's own reviews, the user is the same on every row
+user_reviews_schema = ReviewSchema(many=True, exclude=['user'])
+# One content item's reviews, the content is the same on every row
+content_reviews_schema = ReviewSchema(many=True, exclude=['content'])
@@ -0,0 +1,51 @@
+import os
+import pytest
+from init import db
+from main import create_app
+from utils.search import create_search_index, drop_search_index
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """
+    The app on an empty SQLite database file, with the response cache off so every request reads the database.
+    """
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "test.db"}')
+    monkeypatch.setenv('JWT_SECRET_KEY', 'test')
+    monkeypatch.setenv('CACHE_BACKEND', 'none')
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        create_search_index()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def postgres_app(monkeypatch):
+    """
+    The app on the PostgreSQL database in TEST_POSTGRES_URL, emptied first, skipped when it isn't set.
+
+    e.g. TEST_POSTGRES_URL=postgresql+psycopg2://postgres@localhost/test python -m pytest
+    """
+    url = os.environ.get('TEST_POSTGRES_URL')
+    if not url:
+        pytest.skip('TEST_POSTGRES_URL is not set')
+    monkeypatch.setenv('DATABASE_URL', url)
+    monkeypatch.setenv('JWT_SECRET_KEY', 'test')
+    monkeypatch.setenv('CACHE_BACKEND', 'none')
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        drop_search_index()
+        db.create_all()
+        create_search_index()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,38 @@
+import io
+from init import db
+from models.category import Category
+from utils.bulk_import import import_stream, INVALID_UTF8
+
+
+def run_import(app, kind, body, file_format='jsonl'):
+    with app.app_context():
+        result = import_stream(kind, io.BytesIO(body), file_format, batch_size=10)
+        names = db.session.scalars(db.select(Category.category).order_by(Category.id)).all()
+    return result, names
+
+
+def test_invalid_utf8_row_is_reported_and_the_rest_imported(app):
+    body = b'{"category": "Novel"}\n{"category": "Bad \xff"}\n{"category": "Manga"}\n'
+    result, names = run_import(app, 'categories', body)
+    assert result == {'imported': 2, 'errors': [{'row': 2, 'Error': INVALID_UTF8}]}
+    assert names == ['Novel', 'Manga']
+
+
+def test_invalid_utf8_csv_row_is_reported(app):
+    body = b'category\nNovel\nBad \xff\n'
+    result, names = run_import(app, 'categories', body, 'csv')
+    assert result == {'imported': 1, 'errors': [{'row': 2, 'Error': INVALID_UTF8}]}
+    assert names == ['Novel']
+
+
+def test_value_of_the_wrong_type_only_fails_its_own_row(app):
+    body = b'{"category": "Novel"}\n{"category": ["x"]}\n{"category": "Manga"}\n'
+    result, names = run_import(app, 'categories', body)
+    assert result == {'imported': 2, 'errors': [{'row': 2, 'Error': 'category must be a string.'}]}
+    assert names == ['Novel', 'Manga']
+
+
+def test_content_published_of_the_wrong_type_is_reported(app):
+    body = b'{"title": "T", "category_id": 1, "author_id": 1, "published": 2020}\n'
+    result, _ = run_import(app, 'content', body)
+    assert result == {'imported': 0, 'errors': [{'row': 1, 'Error': 'published must be a string.'}]}
@@ -0,0 +1,18 @@
+from flask import Flask
+from utils.cache import ResponseCache
+
+
+def cache_key(cache, app, url):
+    with app.test_request_context(url):
+        return cache.key('content')
+
+
+def test_key_keeps_encoded_query_values_apart():
+    app = Flask(__name__)
+    app.config['CACHE_BACKEND'] = 'lru'
+    cache = ResponseCache()
+    cache.init_app(app)
+
+    assert cache_key(cache, app, '/content/?q=x%26y%3Dz') != cache_key(cache, app, '/content/?q=x&y=z')
+    # The order of the arguments doesn't matter
+    assert cache_key(cache, app, '/content/?a=1&b=2') == cache_key(cache, app, '/content/?b=2&a=1')
@@ -0,0 +1,26 @@
+from sqlalchemy import create_engine, text
+from utils.db_pool import TimedQueuePool, pool_metrics
+
+
+def engine(path, wait_warn_ms):
+    return create_engine(f'sqlite:///{path}', poolclass=TimedQueuePool, pool_size=1, wait_warn_ms=wait_warn_ms)
+
+
+def test_each_engine_has_its_own_metrics_and_threshold(tmp_path):
+    first, second = engine(tmp_path / 'first.db', 50), engine(tmp_path / 'second.db', 200)
+    for _ in range(3):
+        with first.connect() as conn:
+            conn.execute(text('SELECT 1'))
+    with second.connect() as conn:
+        conn.execute(text('SELECT 1'))
+
+    assert pool_metrics(first)['checkouts'] == 3
+    assert pool_metrics(second)['checkouts'] == 1
+    assert (first.pool.wait_warn_ms, second.pool.wait_warn_ms) == (50, 200)
+
+    # dispose() replaces the pool, the numbers and threshold carry over
+    first.dispose()
+    with first.connect() as conn:
+        conn.execute(text('SELECT 1'))
+    assert pool_metrics(first)['checkouts'] == 4
+    assert first.pool.wait_warn_ms == 50
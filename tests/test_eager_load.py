@@ -0,0 +1,59 @@
+from datetime import date
+import pytest
+from sqlalchemy import event
+from init import db
+from models.author import Author
+from models.category import Category
+from models.content import Content
+from models.review import Review
+from models.user import User
+
+
+# Default page size is 50, so every seeded row is in the first page
+MANY = 20
+
+
+def seed(app, count):
+    """
+    Add count users, authors, categories, content items and reviews, each linked to its own parents.
+    """
+    with app.app_context():
+        start = db.session.scalar(db.select(db.func.count()).select_from(User))
+        for i in range(start, start + count):
+            user = User(first_name=f'First{i}', last_name=f'Last{i}', email=f'user{i}@email.com', password='x')
+            author = Author(author=f'Author {i}')
+            category = Category(category=f'Category {i}')
+            content = Content(title=f'Title {i}', author=author, category=category, genre='Genre',
+                              description='A long enough description', published=date(2020, 1, 1), publisher='Publisher')
+            review = Review(rating=4, comment='Comment', created=date(2023, 1, 1), user=user, content=content)
+            db.session.add_all([user, author, category, content, review])
+        db.session.commit()
+
+
+def count_statements(app, client, path):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200
+    return len(statements), response.get_json()
+
+
+@pytest.mark.parametrize('path', ['/reviews/', '/content/', '/author/', '/category/'])
+def test_statement_count_does_not_grow_with_rows(app, client, path):
+    seed(app, 1)
+    one_row, body = count_statements(app, client, path)
+    assert len(body) == 1
+
+    seed(app, MANY - 1)
+    many_rows, body = count_statements(app, client, path)
+    assert len(body) == MANY
+    assert many_rows == one_row
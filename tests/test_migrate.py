@@ -0,0 +1,36 @@
+import pytest
+from sqlalchemy import text
+from init import db
+from utils.migrate import upgrade_schema
+
+CREATED_NULLABLE = text("""
+    SELECT is_nullable FROM information_schema.columns WHERE table_name = 'reviews' AND column_name = 'created'
+""")
+NOT_NULL_CHECKS = text("SELECT conname FROM pg_constraint WHERE conname LIKE '%_not_null'")
+
+
+def test_not_null_can_be_run_again_after_nulls_are_filled_in(postgres_app):
+    with postgres_app.app_context():
+        # A database from before reviews.created was NOT NULL, with a NULL left in it
+        for statement in [
+            "ALTER TABLE reviews ALTER COLUMN created DROP NOT NULL",
+            "INSERT INTO users (email, password) VALUES ('user@example.com', 'x')",
+            "INSERT INTO authors (author) VALUES ('Author')",
+            "INSERT INTO categories (category) VALUES ('Novel')",
+            "INSERT INTO content (title, author_id, category_id, published) VALUES ('Title', 1, 1, '2020-01-01')",
+            "INSERT INTO reviews (rating, user_id, content_id) VALUES (3, 1, 1)",
+        ]:
+            db.session.execute(text(statement))
+        db.session.commit()
+
+        with pytest.raises(Exception, match='reviews_created_not_null'):
+            upgrade_schema()
+        # The check constraint is gone, so the next run can add it again
+        assert db.session.scalars(NOT_NULL_CHECKS).all() == []
+        assert db.session.scalar(CREATED_NULLABLE) == 'YES'
+
+        db.session.execute(text("UPDATE reviews SET created = '2023-01-01' WHERE created IS NULL"))
+        db.session.commit()
+        assert 'not null reviews.created' in upgrade_schema()
+        assert db.session.scalar(CREATED_NULLABLE) == 'NO'
+        assert db.session.scalars(NOT_NULL_CHECKS).all() == []
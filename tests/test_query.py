@@ -0,0 +1,59 @@
+from datetime import date
+from itertools import permutations
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+from init import db
+from models.content import Content, contents_schema
+from models.review import Review
+from utils.query import _encode_cursor, loader_options, select_fields, sort_order
+from utils.serializers import compile_dumper
+
+
+def order_by_sql(sort_column, descending):
+    stmt = db.select(sort_column.table).order_by(*sort_order(sort_column, sort_column.table.c.id, descending))
+    return str(stmt.compile(dialect=postgresql.dialect())).split('ORDER BY')[1].strip()
+
+
+def test_not_null_sorts_match_their_indexes():
+    # The same order as (content_id, created, id) and (published, id) read forwards or backwards
+    assert order_by_sql(Review.created, True) == 'reviews.created DESC, reviews.id DESC'
+    assert order_by_sql(Review.created, False) == 'reviews.created ASC, reviews.id ASC'
+    assert order_by_sql(Content.published, True) == 'content.published DESC, content.id DESC'
+    # Nullable columns keep their NULLs at the end
+    assert order_by_sql(Content.title, True) == 'content.title DESC NULLS LAST, content.id DESC'
+
+
+def test_cursor_only_checks_for_nulls_on_nullable_columns(app, client):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            cursor = _encode_cursor(date(2020, 1, 1), 10)
+            client.get(f'/content/1/reviews?sort=newest&after={cursor}')
+            client.get(f'/content/?sort=published&after={cursor}')
+            client.get(f'/content/?sort=title&after={_encode_cursor("T", 10)}')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+    sql = '\n'.join(statements)
+    assert 'reviews.created <' in sql and 'reviews.created IS NULL' not in sql
+    assert 'content.published <' in sql and 'content.published IS NULL' not in sql
+    assert 'content.title IS NULL' in sql
+
+
+def test_field_orderings_share_one_schema(app, client):
+    names = ['id', 'title', 'genre', 'published', 'publisher']
+    with app.test_request_context('/?fields=publisher,id'):
+        selected = select_fields(contents_schema)
+    assert list(selected.fields) == ['id', 'publisher']
+
+    client.get(f'/content/?fields={",".join(names)}')
+    sizes = loader_options.cache_info().currsize, compile_dumper.cache_info().currsize
+    # 120 orderings of the same fields add nothing to the caches built for the first one
+    for ordering in permutations(names):
+        assert client.get(f'/content/?fields={",".join(ordering)}').status_code == 200
+    assert (loader_options.cache_info().currsize, compile_dumper.cache_info().currsize) == sizes
@@ -0,0 +1,64 @@
+from datetime import date
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert
+from init import db
+from models.author import Author
+from models.category import Category
+from models.content import Content
+from models.content_rating import ContentRating
+from models.user import User
+from utils.ratings import update_rating, update_ratings
+
+
+def add_content(app, count):
+    with app.app_context():
+        author, category = Author(author='Author'), Category(category='Novel')
+        items = [Content(title=f'Title {i}', published=date(2020, 1, 1), author=author, category=category) for i in range(count)]
+        db.session.add_all(items)
+        db.session.commit()
+        return [item.id for item in items]
+
+
+def summary(app, content_id):
+    with app.app_context():
+        row = db.session.get(ContentRating, content_id)
+        return row.review_count, row.rating_sum, row.histogram
+
+
+def test_first_rating_creates_the_summary(app):
+    content_id, = add_content(app, 1)
+    with app.app_context():
+        update_rating(content_id, added=4)
+        db.session.commit()
+    assert summary(app, content_id) == (1, 4, {'4': 1})
+
+
+def test_summary_committed_by_another_transaction_is_used(app):
+    # Another request's first review committed the summary before this one got to it
+    first, second = add_content(app, 2)
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(insert(ContentRating), [{'content_id': first, 'review_count': 1, 'rating_sum': 5, 'histogram': {'5': 1}}])
+        update_rating(first, added=3)
+        update_ratings([(first, 1), (second, 2)])
+        db.session.commit()
+    assert summary(app, first) == (3, 9, {'5': 1, '3': 1, '1': 1})
+    assert summary(app, second) == (1, 2, {'2': 1})
+
+
+def test_rating_that_isnt_a_whole_number_is_a_bad_request(app, client):
+    content_id, = add_content(app, 1)
+    with app.app_context():
+        user = User(email='user@example.com', password='x')
+        db.session.add(user)
+        db.session.commit()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+
+    for rating in ('great', 4.5, None, True):
+        response = client.post('/reviews/', json={'content_id': content_id, 'rating': rating}, headers=headers)
+        assert response.status_code == 400 and 'rating' in response.get_json()['Error']
+
+    review_id = client.post('/reviews/', json={'content_id': content_id, 'rating': 4}, headers=headers).get_json()['id']
+    response = client.put(f'/reviews/{review_id}', json={'rating': 'great'}, headers=headers)
+    assert response.status_code == 400 and 'rating' in response.get_json()['Error']
+    assert summary(app, content_id) == (1, 4, {'4': 1})
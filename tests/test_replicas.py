@@ -0,0 +1,60 @@
+import shutil
+from datetime import date
+import pytest
+from flask_jwt_extended import create_access_token
+from init import db, replicas
+from main import create_app
+from models.author import Author
+from models.category import Category
+from models.content import Content
+from models.user import User
+from utils.search import create_search_index
+
+
+@pytest.fixture
+def replica_app(tmp_path, monkeypatch):
+    """
+    The app with the LRU cache and a replica that is a copy of the database taken before any review was written.
+    """
+    primary, replica = tmp_path / 'primary.db', tmp_path / 'replica.db'
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{primary}')
+    monkeypatch.setenv('DATABASE_REPLICA_URLS', f'sqlite:///{replica}')
+    monkeypatch.setenv('JWT_SECRET_KEY', 'test')
+    monkeypatch.setenv('CACHE_BACKEND', 'lru')
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        create_search_index()
+        user = User(first_name='First', last_name='Last', email='user@example.com', password='x')
+        db.session.add_all([user, Content(title='Title', published=date(2020, 1, 1),
+                                          author=Author(author='Author'), category=Category(category='Novel'))])
+        db.session.commit()
+        token = create_access_token(identity=str(user.id), additional_claims={'is_admin': False})
+    # The replica never catches up, like one that is lagging behind
+    shutil.copy(primary, replica)
+    app.config['TEST_TOKEN'] = token
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+    for read_replica in replicas.replicas:
+        read_replica.engine.dispose()
+
+
+def review_count(client, headers=None):
+    return len(client.get('/content/1/reviews', headers=headers).get_json())
+
+
+def test_writer_reads_their_write_past_a_cached_replica_response(replica_app):
+    client = replica_app.test_client()
+    headers = {'Authorization': f'Bearer {replica_app.config["TEST_TOKEN"]}'}
+
+    response = client.post('/reviews/', json={'content_id': 1, 'rating': 5, 'comment': 'Comment'}, headers=headers)
+    assert response.status_code == 201
+    # Another user's read after the write fills the cache from the replica
+    assert review_count(client) == 0
+    assert review_count(client) == 0
+
+    # The writer skips it and reads the primary
+    assert review_count(client, headers) == 1
+    # Their response replaced the stale one in the cache
+    assert review_count(client) == 1
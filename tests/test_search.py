@@ -0,0 +1,68 @@
+from datetime import date
+import pytest
+from flask_jwt_extended import create_access_token
+from init import db
+from models.author import Author
+from models.category import Category
+from models.content import Content
+from models.user import User
+from utils.search import rebuild_search_index, remove_content, search_content
+
+
+# The SQLite and PostgreSQL statements are different, so both run through the same steps
+@pytest.fixture(params=['app', 'postgres_app'])
+def search_app(request):
+    return request.getfixturevalue(request.param)
+
+
+def search(app, q):
+    with app.app_context():
+        return search_content(q, 50, 0)
+
+
+def test_search_index_follows_the_content(search_app):
+    app = search_app
+    client = app.test_client()
+    with app.app_context():
+        author, category = Author(author='Ursula Le Guin'), Category(category='Novel')
+        admin = User(email='admin@example.com', password='x', is_admin=True)
+        items = [Content(title='The Left Hand of Darkness', genre='Science fiction', description='Winter planet',
+                         published=date(1969, 3, 1), author=author, category=category),
+                 Content(title='A Wizard of Earthsea', genre='Fantasy', description='A school for wizards on Roke',
+                         published=date(1968, 11, 1), author=author, category=category)]
+        db.session.add_all([admin, *items])
+        db.session.commit()
+        darkness, wizard = (item.id for item in items)
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(admin.id), additional_claims={"is_admin": True})}'}
+        # flask db reindex-search
+        assert rebuild_search_index() == 2
+
+    assert search(app, 'darkness') == [darkness]
+    # Every word has to match, in any of the columns
+    assert search(app, 'guin fantasy') == [wizard]
+    assert search(app, 'darkness fantasy') == []
+    # Punctuation and search syntax in q are not errors
+    response = client.get('/content/search?q="left hand" OR (wizard:* & -')
+    assert response.status_code == 200
+
+    # Creating content indexes it, and a title match ranks above a description match
+    response = client.post('/content/', json={'title': 'Roke Island', 'genre': 'Fantasy', 'description': 'Another one',
+                                              'published': '1990-01-01', 'publisher': 'Publisher',
+                                              'category_id': 1, 'author_id': 1}, headers=headers)
+    assert response.status_code == 201
+    created = response.get_json()['id']
+    assert [item['id'] for item in client.get('/content/search?q=roke').get_json()] == [created, wizard]
+
+    # Renaming the author reindexes all of their content
+    assert client.put('/author/1', json={'author': 'Ursula K. Le Guin'}, headers=headers).status_code == 200
+    assert sorted(search(app, 'ursula')) == sorted([darkness, wizard, created])
+
+    with app.app_context():
+        remove_content([created])
+        db.session.commit()
+    assert search(app, 'roke') == [wizard]
+
+    # Deleting content removes its entry (remove_content_where)
+    assert client.delete(f'/content/{darkness}', headers=headers).status_code == 200
+    assert search(app, 'darkness') == []
+    assert sorted(search(app, 'ursula')) == [wizard]
@@ -0,0 +1,41 @@
+from sqlalchemy import event
+from sqlalchemy.orm import aliased, with_loader_criteria
+from init import db
+from models.author import Author
+from models.content import Content
+from models.review import Review
+from utils.soft_delete import SoftDeleteMixin
+
+
+def executed(app, stmt, **options):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            db.session.execute(stmt, execution_options=options)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return statements[0]
+
+
+def test_deleted_rows_are_hidden_from_every_select(app):
+    assert 'content.deleted_at IS NULL' in executed(app, db.select(Content.id))
+    assert 'authors_1.deleted_at IS NULL' in executed(app, db.select(aliased(Author)))
+    # Reviews are also hidden through their content
+    statement = executed(app, db.select(Review))
+    assert 'reviews.deleted_at IS NULL' in statement and 'content.deleted_at IS NULL' in statement
+    assert 'deleted_at' not in executed(app, db.select(Content.id), include_deleted=True)
+
+
+def test_mixin_criteria_needs_include_aliases():
+    # Why _hide_deleted sets include_aliases: without it the mixin's subclasses aren't matched at all
+    def compiled(include_aliases):
+        criteria = with_loader_criteria(SoftDeleteMixin, lambda cls: cls.deleted_at.is_(None), include_aliases=include_aliases)
+        return str(db.select(Content.id).options(criteria))
+
+    assert 'deleted_at IS NULL' not in compiled(False)
+    assert 'deleted_at IS NULL' in compiled(True)
@@ -0,0 +1,121 @@
+import io
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgiInstance
+from flask import request_started
+from sqlalchemy.ext.asyncio import AsyncSession
+from werkzeug.exceptions import HTTPException
+from init import db, replicas
+from utils.async_db import create_async_db_engine
+
+
+class _ThreadedWsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs every WSGI call on one shared thread by default, which would
+    # handle the write routes one at a time. Use the event loop's thread pool instead
+    run_wsgi_app = sync_to_async(WsgiToAsgiInstance.__dict__['run_wsgi_app'].func, thread_sensitive=False)
+
+
+class AsyncReadApp:
+    """
+    ASGI application that runs the async_read GET routes on the event loop.
+
+    A GET or HEAD request to a route marked with @async_read is dispatched to
+    the normal Flask view, but db.session is an asyncio session for the length
+    of the request. The view runs inside the session's greenlet, so every query
+    it makes (and every lazy load while dumping) awaits the database driver
+    instead of blocking a thread. Thousands of these reads can wait on the
+    database at once while only the connection pool limits how many run.
+
+    Every other request, and ?stream= requests whose rows are read while the
+    body is sent, go to the Flask app unchanged in a worker thread. The models,
+    schemas, cache and error handlers are the same on both paths.
+
+    With read replicas, each replica gets an asyncio engine too and the read
+    uses the one ReadReplicas.choose picks, with the same read-your-writes
+    rule as the WSGI path. The pick can run a blocking health check, so it
+    runs in a worker thread.
+
+    The Flask view still runs on the event loop thread, so anything slow that
+    isn't a database query (a Redis cache lookup, a large dump) holds up the
+    other requests for that long.
+
+    Usage:
+        uvicorn asgi:app
+    """
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.engine = create_async_db_engine(flask_app)
+        # For GET /metrics/db-pool
+        flask_app.extensions['async_read_engine'] = self.engine
+        replicas.add_async_engines(lambda url: create_async_db_engine(flask_app, url))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f'Unsupported ASGI scope type {scope["type"]}')
+
+        environ = self._environ(scope)
+        if self._is_async_read(environ):
+            response = await self._read(environ)
+            body = b'' if scope['method'] == 'HEAD' else response.get_data()
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                            for name, value in response.headers.items()],
+            })
+            await send({'type': 'http.response.body', 'body': body})
+            return
+        await _ThreadedWsgiInstance(self.flask_app)(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                for replica in replicas.replicas:
+                    await replica.async_engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _environ(self, scope):
+        instance = WsgiToAsgiInstance(None)
+        instance.scope = scope
+        # Only bodyless GET and HEAD requests use the environ, the rest are rebuilt by asgiref
+        return instance.build_environ(scope, io.BytesIO())
+
+    def _is_async_read(self, environ):
+        if environ['REQUEST_METHOD'] not in ('GET', 'HEAD') or 'stream' in parse_qs(environ['QUERY_STRING'], keep_blank_values=True):
+            return False
+        try:
+            endpoint, _ = self.flask_app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return False
+        return getattr(self.flask_app.view_functions.get(endpoint), 'async_read', False)
+
+    async def _read(self, environ):
+        # The same steps as Flask.full_dispatch_request, with the view run in the session's greenlet
+        app = self.flask_app
+        with app.request_context(environ):
+            # Chosen before the before_request hooks, which then find it already done
+            replica = await sync_to_async(replicas.choose, thread_sensitive=False)() if replicas.replicas else None
+            session = AsyncSession(self.engine if replica is None else replica.async_engine)
+            db.session.registry.set(session.sync_session)
+            try:
+                try:
+                    request_started.send(app)
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await session.run_sync(lambda _: app.dispatch_request())
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                return app.finalize_request(rv)
+            except Exception as e:
+                return app.handle_exception(e)
+            finally:
+                # Closed here, Flask-SQLAlchemy's teardown would close it outside the greenlet
+                await session.close()
+                db.session.registry.clear()
@@ -0,0 +1,59 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from utils.db_pool import async_engine_options
+
+
+# The asyncio driver used for each database when ASYNC_DATABASE_URL isn't set
+ASYNC_DRIVERS = {
+    'postgresql': 'asyncpg',
+    'sqlite': 'aiosqlite',
+}
+
+
+def async_read(view):
+    """
+    Mark a GET route as able to run on the async read path.
+
+    When the app is served with asgi.py, requests to marked routes run on the
+    event loop with an asyncio database session (see utils/asgi.py), everything
+    else runs in a worker thread as before. A marked route must only read from
+    the database through db.session, and it has no effect under a WSGI server.
+    Put it between the route and cache decorators.
+    """
+    view.async_read = True
+    return view
+
+
+def async_database_url(app, database_url=None):
+    """
+    Get the database URL for the asyncio engine.
+
+    ASYNC_DATABASE_URL is used if it is set, otherwise the driver in
+    SQLALCHEMY_DATABASE_URI (or database_url, e.g. a read replica's URL) is
+    swapped for the asyncio driver of that database in ASYNC_DRIVERS.
+
+    Returns:
+        sqlalchemy.engine.URL: The async driver URL.
+    """
+    if database_url is None and app.config.get('ASYNC_DATABASE_URL'):
+        return make_url(app.config['ASYNC_DATABASE_URL'])
+
+    url = make_url(database_url or app.config['SQLALCHEMY_DATABASE_URI'])
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'There is no async driver for {backend}, set ASYNC_DATABASE_URL')
+    # Each connection to an in-memory SQLite database is a different, empty database
+    if backend == 'sqlite' and url.database in (None, '', ':memory:'):
+        raise ValueError('The async read path needs a SQLite database file, not an in-memory database')
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+
+def create_async_db_engine(app, database_url=None):
+    """
+    Create the asyncio engine for the async read path.
+
+    It has its own connection pool, sized with the same DB_POOL_* settings as
+    the app's engine. Pass database_url to create one for a read replica.
+    """
+    url = async_database_url(app, database_url)
+    return create_async_engine(url, **async_engine_options(url.render_as_string(hide_password=False)))
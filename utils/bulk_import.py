@@ -0,0 +1,371 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from itertools import islice
+from flask import request, abort
+from sqlalchemy.exc import SQLAlchemyError
+from init import db, cache
+from models.author import Author
+from models.category import Category
+from models.content import Content
+from models.review import Review
+from utils.query import int_arg
+from utils.ratings import update_ratings
+from utils.search import index_content
+
+
+IMPORT_FORMATS = ('jsonl', 'csv')
+DEFAULT_BATCH_SIZE = 1000
+# Most reviews accepted by one POST /reviews/batch request
+MAX_BATCH_REVIEWS = 10000
+
+
+INVALID_UTF8 = 'The row is not valid UTF-8.'
+
+
+def _invalid_utf8(text):
+    # import_stream decodes with surrogateescape, which turns bytes that aren't UTF-8 into lone surrogates
+    try:
+        text.encode('utf-8')
+    except UnicodeEncodeError:
+        return True
+    return False
+
+
+def read_rows(stream, file_format):
+    """
+    Read rows one at a time from a JSON Lines or CSV text stream.
+
+    The file is never read into memory as a whole, each line is parsed as it
+    is reached. Blank JSON lines are skipped.
+
+    Parameters:
+        stream: A text file object (or anything that iterates over lines).
+        file_format (str): 'jsonl' or 'csv'.
+
+    Yields:
+        tuple: (row_number, row, error). row is a dict, or None when the line
+        could not be parsed, in which case error holds the reason.
+    """
+    if file_format == 'csv':
+        for row_number, row in enumerate(csv.DictReader(stream), start=1):
+            if any(_invalid_utf8(value) for value in row.values() if isinstance(value, str)):
+                yield row_number, None, INVALID_UTF8
+            else:
+                yield row_number, row, None
+        return
+
+    for row_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        if _invalid_utf8(line):
+            yield row_number, None, INVALID_UTF8
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as err:
+            yield row_number, None, f'Invalid JSON: {err}'
+            continue
+        if not isinstance(row, dict):
+            yield row_number, None, 'Each line must be a JSON object.'
+            continue
+        yield row_number, row, None
+
+
+def _to_int(value):
+    """
+    Convert an id from JSON or CSV (where it is a string) to an int, or None if it isn't one.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _not_string(row, names):
+    """
+    Return an error for the first of the named values that is set but isn't a string, None if they all are.
+
+    JSON rows can hold lists, objects and numbers, which the database would
+    reject for the whole batch.
+    """
+    for name in names:
+        value = row.get(name)
+        if value is not None and not isinstance(value, str):
+            return f'{name} must be a string.'
+    return None
+
+
+def _validate_author(row):
+    if not row.get('author'):
+        return None, 'author is required'
+    error = _not_string(row, ['author'])
+    if error:
+        return None, error
+    return {'author': row['author']}, None
+
+
+def _validate_category(row):
+    if not row.get('category'):
+        return None, 'category is required'
+    error = _not_string(row, ['category'])
+    if error:
+        return None, error
+    return {'category': row['category']}, None
+
+
+def _validate_content(row):
+    error = _not_string(row, ['title', 'genre', 'description', 'published', 'publisher'])
+    if error:
+        return None, error
+    category_id = _to_int(row.get('category_id'))
+    author_id = _to_int(row.get('author_id'))
+    if not category_id or not author_id:
+        return None, 'Both category_id and author_id must be provided when creating content.'
+
+    try:
+        published = datetime.strptime(row.get('published') or '', '%Y-%m-%d').date()
+    except ValueError:
+        return None, 'Invalid date format for: published. Please provide the date in this format: YYYY-MM-DD.'
+
+    return {
+        'title': row.get('title'),
+        'category_id': category_id,
+        'author_id': author_id,
+        'genre': row.get('genre'),
+        'description': row.get('description'),
+        'published': published,
+        'publisher': row.get('publisher'),
+    }, None
+
+
+def _validate_review(row):
+    if not isinstance(row, dict):
+        return None, 'Each review must be a JSON object.'
+    content_id = _to_int(row.get('content_id'))
+    if not content_id:
+        return None, 'content_id must be provided when creating a review.'
+    rating = _to_int(row.get('rating'))
+    if rating is None:
+        return None, 'rating must be provided as a whole number.'
+    error = _not_string(row, ['comment'])
+    if error:
+        return None, error
+    return {'content_id': content_id, 'rating': rating, 'comment': row.get('comment')}, None
+
+
+def _existing_ids(model, ids):
+    """
+    Return which of the given ids exist in a table, using one IN query.
+    """
+    if not ids:
+        return set()
+    stmt = db.select(model.id).where(model.id.in_(ids))
+    return set(db.session.scalars(stmt))
+
+
+def _check_content_keys(batch):
+    """
+    Check the author_id and category_id of a batch of content rows with one query per table.
+
+    Returns:
+        list: Error messages, one per row, None for rows whose keys exist.
+    """
+    author_ids = _existing_ids(Author, {values['author_id'] for _, values in batch})
+    category_ids = _existing_ids(Category, {values['category_id'] for _, values in batch})
+
+    errors = []
+    for _, values in batch:
+        if values['category_id'] not in category_ids:
+            errors.append(f'Category with id {values["category_id"]} does not exist.')
+        elif values['author_id'] not in author_ids:
+            errors.append(f'Author with id {values["author_id"]} does not exist.')
+        else:
+            errors.append(None)
+    return errors
+
+
+IMPORTERS = {
+    'content': (Content, _validate_content, _check_content_keys),
+    'authors': (Author, _validate_author, None),
+    'categories': (Category, _validate_category, None),
+}
+
+# Cached responses that include each kind of row
+CACHE_NAMESPACES = {
+    'content': ('content', 'reviews', 'author', 'category'),
+    'authors': ('author',),
+    'categories': ('category',),
+}
+
+
+def _db_error(err):
+    return str(getattr(err, 'orig', None) or err)
+
+
+def _insert(kind, model, batch):
+    # Insert and commit (row_number, values) pairs, imported content is indexed in the same transaction
+    ids = db.session.scalars(db.insert(model).returning(model.id), [values for _, values in batch]).all()
+    if kind == 'content':
+        index_content(ids)
+    db.session.commit()
+    return len(ids)
+
+
+def import_rows(kind, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Validate and insert rows in batches, collecting an error for each row that fails.
+
+    Each batch is validated row by row, then foreign keys for the whole batch
+    are checked with one IN query per table, and the valid rows are inserted
+    with a single executemany INSERT and committed. Imported content is added
+    to the search index in the same transaction. A bad row is reported and
+    skipped, it doesn't stop the rest of the load. If the database still
+    rejects the INSERT for a batch, the batch is rolled back and inserted
+    again one row at a time, so only the rows it rejects are reported.
+
+    Parameters:
+        kind (str): 'content', 'authors' or 'categories'.
+        rows: An iterable of (row_number, row, error) tuples from read_rows().
+        batch_size (int): Number of rows validated and inserted together.
+
+    Returns:
+        dict: The number of rows imported and a list of per-row errors.
+    """
+    model, validate, check_keys = IMPORTERS[kind]
+    imported = 0
+    errors = []
+    rows = iter(rows)
+
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+
+        batch = []
+        for row_number, row, error in chunk:
+            if error is None:
+                values, error = validate(row)
+            if error is not None:
+                errors.append({'row': row_number, 'Error': error})
+            else:
+                batch.append((row_number, values))
+
+        if check_keys and batch:
+            key_errors = check_keys(batch)
+            errors.extend({'row': row_number, 'Error': error}
+                          for (row_number, _), error in zip(batch, key_errors) if error)
+            batch = [item for item, error in zip(batch, key_errors) if not error]
+
+        if not batch:
+            continue
+
+        try:
+            imported += _insert(kind, model, batch)
+        except SQLAlchemyError:
+            db.session.rollback()
+            for item in batch:
+                try:
+                    imported += _insert(kind, model, [item])
+                except SQLAlchemyError as err:
+                    db.session.rollback()
+                    errors.append({'row': item[0], 'Error': _db_error(err)})
+
+    if imported:
+        cache.invalidate(*CACHE_NAMESPACES[kind])
+    return {'imported': imported, 'errors': errors}
+
+
+def create_reviews(items, user_id):
+    """
+    Create many reviews by one user in a single transaction.
+
+    Every item is validated, then all the content_ids are checked with one IN
+    query. The valid reviews are inserted with a single executemany INSERT,
+    their ratings are added to the rating summaries, and everything is
+    committed together. Like a single review, each is stamped with today's
+    date and the user's id. Invalid items are reported and skipped. If the
+    INSERT fails, nothing is created and every valid item gets the error.
+
+    Parameters:
+        items (list): The reviews, dicts with content_id, rating and comment.
+        user_id: The id of the user creating the reviews.
+
+    Returns:
+        dict: The number of reviews created and one result per item in the
+        order given, with the new review's id or the error.
+    """
+    results = [None] * len(items)
+    batch = []
+    for index, item in enumerate(items):
+        values, error = _validate_review(item)
+        if error is not None:
+            results[index] = {'index': index, 'Error': error}
+        else:
+            batch.append((index, values))
+
+    content_ids = _existing_ids(Content, {values['content_id'] for _, values in batch})
+    today = date.today()
+    valid = []
+    for index, values in batch:
+        if values['content_id'] not in content_ids:
+            results[index] = {'index': index, 'Error': f'Content with id {values["content_id"]} does not exist.'}
+        else:
+            valid.append((index, {**values, 'created': today, 'user_id': user_id}))
+
+    if not valid:
+        return {'created': 0, 'results': results}
+    try:
+        # The ids come back in the order sent. PostgreSQL still inserts them in batches,
+        # SQLite can't guarantee the order of a batch so it inserts one row at a time
+        stmt = db.insert(Review).returning(Review.id, sort_by_parameter_order=True)
+        ids = db.session.scalars(stmt, [values for _, values in valid]).all()
+        update_ratings((values['content_id'], values['rating']) for _, values in valid)
+        db.session.commit()
+    except SQLAlchemyError as err:
+        db.session.rollback()
+        message = _db_error(err)
+        for index, _ in valid:
+            results[index] = {'index': index, 'Error': message}
+        return {'created': 0, 'results': results}
+
+    for (index, _), review_id in zip(valid, ids):
+        results[index] = {'index': index, 'id': review_id}
+    # The content's rating stats change along with its reviews
+    cache.invalidate('reviews', 'content')
+    return {'created': len(ids), 'results': results}
+
+
+def import_stream(kind, binary_stream, file_format, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Import rows from a binary stream such as a request body or an opened file.
+
+    Bytes that aren't valid UTF-8 don't stop the import, the rows they are in
+    are reported as errors.
+    """
+    text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8', errors='surrogateescape', newline='')
+    return import_rows(kind, read_rows(text_stream, file_format), batch_size)
+
+
+def import_request(kind):
+    """
+    Import rows from the body of the current request.
+
+    The format is taken from ?format=jsonl|csv, or from the Content-Type
+    (text/csv means CSV, anything else is read as JSON Lines). The batch
+    size can be changed with ?batch_size=.
+
+    Returns:
+        tuple: The import summary and HTTP status code 201 (Created), or 400
+        (Bad Request) if no rows could be imported.
+    """
+    file_format = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'jsonl')
+    if file_format not in IMPORT_FORMATS:
+        abort(400, description=f'format must be one of: {", ".join(IMPORT_FORMATS)}.')
+    batch_size = int_arg('batch_size', DEFAULT_BATCH_SIZE, minimum=1)
+
+    result = import_stream(kind, request.stream, file_format, batch_size)
+    if result['errors'] and not result['imported']:
+        return result, 400
+    return result, 201
@@ -0,0 +1,160 @@
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+from flask import request, current_app, Response, g
+
+
+class LRUBackend:
+    """
+    In-process least recently used cache, the default backend.
+
+    Each worker process has its own copy, so invalidation only reaches the
+    process that handled the write. Entries also expire after CACHE_TTL seconds,
+    which bounds how stale another process can be.
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def generation(self, namespace):
+        return self._generations.get(namespace, 0)
+
+    def bump(self, namespace):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+
+class RedisBackend:
+    """
+    Cache shared by every worker process, stored in Redis.
+
+    Any client with Redis' get, set and incr methods can be passed in, so a
+    local stand-in such as fakeredis can be used instead of a real server.
+    """
+    def __init__(self, client, ttl, prefix='cache:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+    def generation(self, namespace):
+        return int(self.client.get(f'{self.prefix}generation:{namespace}') or 0)
+
+    def bump(self, namespace):
+        self.client.incr(f'{self.prefix}generation:{namespace}')
+
+
+class ResponseCache:
+    """
+    Cache for GET responses, invalidated when the matching data is written.
+
+    Entries are grouped into namespaces (one per blueprint). Each namespace has
+    a generation number that is part of every key, so invalidating a namespace
+    just bumps its generation and the old entries are never read again.
+
+    Config:
+        CACHE_BACKEND: 'lru' (default), 'redis' or 'none'.
+        CACHE_SIZE: Max entries in the LRU backend (default 1024).
+        CACHE_TTL: Seconds an entry is kept (default 60).
+        CACHE_REDIS_URL: Redis server for the redis backend.
+    """
+    def __init__(self):
+        self.backend = None
+
+    def init_app(self, app, client=None):
+        backend = app.config.setdefault('CACHE_BACKEND', 'lru')
+        size = app.config.setdefault('CACHE_SIZE', 1024)
+        ttl = app.config.setdefault('CACHE_TTL', 60)
+
+        if backend == 'none':
+            self.backend = None
+        elif backend == 'redis':
+            if client is None:
+                # redis is only needed when this backend is used
+                import redis
+                client = redis.Redis.from_url(app.config['CACHE_REDIS_URL'])
+            self.backend = RedisBackend(client, ttl)
+        else:
+            self.backend = LRUBackend(size, ttl)
+
+    def key(self, namespace):
+        # Encoded again so a value containing & or = can't look like another set of arguments
+        query = urlencode(sorted(request.args.items(multi=True)))
+        return f'{namespace}:{self.backend.generation(namespace)}:{request.path}?{query}'
+
+    def invalidate(self, *namespaces):
+        """
+        Throw away every cached response in the given namespaces.
+
+        Usage:
+            cache.invalidate('content', 'reviews')
+        """
+        if self.backend is None:
+            return
+        for namespace in namespaces:
+            self.backend.bump(namespace)
+
+    def cached(self, namespace):
+        """
+        Decorator that caches a GET route's response and adds an ETag to it.
+
+        A request with a matching If-None-Match header gets an empty 304 (Not
+        Modified). Only 200 responses are stored, and streamed responses are
+        passed through untouched. A request with g.refresh_cache set (a recent
+        writer's read, see ReadReplicas.choose) skips the lookup and stores
+        its response over the cached one.
+        """
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                key = self.key(namespace) if self.backend is not None else None
+                entry = self.backend.get(key) if key and not g.get('refresh_cache') else None
+                if entry is not None:
+                    response = Response(entry['body'], status=entry['status'], headers=entry['headers'])
+                    return response.make_conditional(request)
+
+                response = current_app.make_response(fn(*args, **kwargs))
+                if response.is_streamed or response.status_code != 200:
+                    return response
+
+                response.add_etag()
+                if key:
+                    self.backend.set(key, {
+                        'status': response.status_code,
+                        'headers': list(response.headers.items()),
+                        'body': response.get_data(as_text=True),
+                    })
+                return response.make_conditional(request)
+            return wrapper
+        return decorator
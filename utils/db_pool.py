@@ -0,0 +1,151 @@
+import logging
+import os
+import threading
+import time
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+
+logger = logging.getLogger(__name__)
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited for a connection.
+
+    The wait includes opening a new connection when the pool has room for one.
+    A checkout that waits longer than DB_POOL_WAIT_WARN_MS is logged as a
+    warning with the pool status, which usually means there are more worker
+    threads than connections.
+
+    Each pool keeps its own numbers, so every engine is reported separately.
+    create_engine passes wait_warn_ms through from its keyword arguments.
+    """
+    def __init__(self, creator, wait_warn_ms=100, **kwargs):
+        super().__init__(creator, **kwargs)
+        self.wait_warn_ms = wait_warn_ms
+        self.metrics = {'checkouts': 0, 'timeouts': 0, 'total_wait_ms': 0.0, 'max_wait_ms': 0.0}
+        self.metrics_lock = threading.Lock()
+
+    def recreate(self):
+        # engine.dispose() swaps in a new pool, keep the threshold and the numbers so far
+        pool = super().recreate()
+        pool.wait_warn_ms = self.wait_warn_ms
+        pool.metrics, pool.metrics_lock = self.metrics, self.metrics_lock
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self.metrics_lock:
+                self.metrics['timeouts'] += 1
+            raise
+        finally:
+            waited_ms = (time.perf_counter() - start) * 1000
+            with self.metrics_lock:
+                self.metrics['checkouts'] += 1
+                self.metrics['total_wait_ms'] += waited_ms
+                self.metrics['max_wait_ms'] = max(self.metrics['max_wait_ms'], waited_ms)
+            if waited_ms > self.wait_warn_ms:
+                logger.warning('Waited %.1f ms for a database connection (%s)', waited_ms, self.status())
+
+
+class TimedAsyncQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """
+    TimedQueuePool for the asyncio engine used by the async read path.
+    """
+
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes')
+
+
+def engine_options(database_uri):
+    """
+    Build SQLALCHEMY_ENGINE_OPTIONS from environment variables.
+
+    Environment:
+        DB_POOL_SIZE: Connections kept open (default 5).
+        DB_MAX_OVERFLOW: Extra connections allowed under load (default 10).
+        DB_POOL_TIMEOUT: Seconds to wait for a connection before failing (default 30).
+        DB_POOL_RECYCLE: Seconds before a connection is replaced (default 1800).
+        DB_POOL_PRE_PING: Test connections before use so ones killed by a failover are replaced (default true).
+        DB_STATEMENT_TIMEOUT: PostgreSQL statement_timeout in milliseconds, 0 for none (default 0).
+        DB_POOL_WAIT_WARN_MS: Log a warning when a checkout waits longer than this (default 100).
+
+    Returns:
+        dict: Keyword arguments for create_engine.
+    """
+    # In-memory SQLite uses a single connection per thread, pool sizing doesn't apply
+    if not database_uri or database_uri in ('sqlite://', 'sqlite:///:memory:'):
+        return {}
+
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', True),
+        'wait_warn_ms': float(os.environ.get('DB_POOL_WAIT_WARN_MS', 100)),
+    }
+    statement_timeout = int(os.environ.get('DB_STATEMENT_TIMEOUT', 0))
+    if statement_timeout and database_uri.startswith('postgresql'):
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+    return options
+
+
+def async_engine_options(database_uri):
+    """
+    Build the create_async_engine options for the async read path.
+
+    Uses the same DB_POOL_* and DB_STATEMENT_TIMEOUT settings as engine_options,
+    the asyncio engine has its own pool of that size.
+
+    Parameters:
+        database_uri: The async driver URL, e.g. postgresql+asyncpg://...
+
+    Returns:
+        dict: Keyword arguments for create_async_engine.
+    """
+    database_uri = str(database_uri)
+    options = engine_options(database_uri)
+    if 'poolclass' in options:
+        options['poolclass'] = TimedAsyncQueuePool
+    # asyncpg takes server settings instead of libpq's options string
+    if 'connect_args' in options and '+asyncpg' in database_uri:
+        options['connect_args'] = {'server_settings': {'statement_timeout': str(int(os.environ['DB_STATEMENT_TIMEOUT']))}}
+    return options
+
+
+def pool_metrics(engine):
+    """
+    Report the state of an engine's connection pool.
+
+    Parameters:
+        engine: A sync Engine, or an AsyncEngine.
+
+    Returns:
+        dict: Pool size, connections checked out and idle, overflow in use,
+        and how many checkouts there have been and how long they waited.
+    """
+    pool = getattr(engine, 'sync_engine', engine).pool
+    metrics = {'pool': type(pool).__name__, 'status': pool.status()}
+    if isinstance(pool, QueuePool):
+        metrics.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+        })
+    if isinstance(pool, TimedQueuePool):
+        with pool.metrics_lock:
+            checkouts = pool.metrics['checkouts']
+            metrics.update({
+                'checkouts': checkouts,
+                'timeouts': pool.metrics['timeouts'],
+                'average_wait_ms': round(pool.metrics['total_wait_ms'] / checkouts, 2) if checkouts else None,
+                'max_wait_ms': round(pool.metrics['max_wait_ms'], 2),
+            })
+    return metrics
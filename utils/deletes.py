@@ -0,0 +1,57 @@
+from init import db
+from models.content import Content
+from models.content_rating import ContentRating
+from models.review import Review
+from utils.search import remove_content_where
+
+
+def soft_delete_content_where(condition):
+    """
+    Soft delete every content item matching a condition.
+
+    The content rows are marked with one UPDATE and drop out of every query
+    straight away, along with their reviews (see Review.not_deleted), so the
+    request doesn't wait on millions of review rows. Their search entries are
+    removed now so searches don't return them. Everything is deleted for good
+    later by utils.purge.
+
+    It runs in the current session's transaction, the caller commits.
+
+    Usage:
+        soft_delete_content_where(Content.author_id == author.id)
+
+    Returns:
+        int: The number of content items deleted.
+    """
+    remove_content_where(condition)
+    stmt = db.update(Content).where(condition, Content.deleted_at.is_(None)).values(deleted_at=db.func.now())
+    return db.session.execute(stmt, execution_options={'synchronize_session': False}).rowcount
+
+
+def delete_content_where(condition):
+    """
+    Delete every content item matching a condition, with its reviews, rating summary and search entry.
+
+    Each table is cleared with one DELETE ... WHERE content_id IN (SELECT ...),
+    so nothing is loaded into the session and the time taken depends on the
+    database, not on how many reviews Python would have had to load. The
+    foreign keys are also ON DELETE CASCADE, but databases created before that
+    (and SQLite, which doesn't enforce foreign keys by default) need the
+    explicit deletes.
+
+    Soft deleted rows aren't hidden from this. It runs in the current
+    session's transaction, the caller commits.
+
+    Usage:
+        delete_content_where(Content.author_id == author.id)
+
+    Returns:
+        int: The number of content items deleted.
+    """
+    ids = db.select(Content.id).where(condition)
+    # The session holds none of these rows, so there is nothing to synchronise
+    options = {'synchronize_session': False}
+    for model in (Review, ContentRating):
+        db.session.execute(db.delete(model).where(model.content_id.in_(ids)), execution_options=options)
+    remove_content_where(condition)
+    return db.session.execute(db.delete(Content).where(condition), execution_options=options).rowcount
@@ -0,0 +1,86 @@
+import json
+from datetime import date
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is optional, the standard library json module is used without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+JSON_BACKENDS = ('auto', 'orjson', 'stdlib')
+
+
+def _default(obj):
+    # Flask writes dates in the HTTP (RFC 822) format, use ISO 8601 like the
+    # schemas and orjson do so the output doesn't depend on the backend.
+    # datetime is a subclass of date, so it's covered too
+    if isinstance(obj, date):
+        return obj.isoformat()
+    return DefaultJSONProvider.default(obj)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that encodes with orjson when it is installed.
+
+    orjson is several times faster than the json module on large lists and
+    writes bytes straight into the response. Anything it can't encode natively
+    goes through the same default() as the standard library backend, and calls
+    with json.dumps() options orjson doesn't have fall back to the json module.
+    Non-ASCII characters are written as UTF-8 by orjson instead of \\u escapes,
+    which is the same JSON.
+
+    Config:
+        JSON_BACKEND: 'auto' (default, orjson if installed), 'orjson' or 'stdlib'.
+    """
+    default = staticmethod(_default)
+
+    def __init__(self, app):
+        super().__init__(app)
+        backend = app.config.setdefault('JSON_BACKEND', 'auto')
+        if backend not in JSON_BACKENDS:
+            raise ValueError(f'JSON_BACKEND must be one of {", ".join(JSON_BACKENDS)}, not {backend}')
+        if backend == 'orjson' and orjson is None:
+            raise RuntimeError('JSON_BACKEND is orjson but orjson is not installed')
+        self.backend = 'orjson' if orjson is not None and backend != 'stdlib' else 'stdlib'
+
+    def _orjson_dumps(self, obj, indent=None, sort_keys=None, newline=False):
+        # Keys like the rating histogram's are converted to strings as json.dumps does
+        option = orjson.OPT_NON_STR_KEYS
+        if newline:
+            option |= orjson.OPT_APPEND_NEWLINE
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if self.sort_keys if sort_keys is None else sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        # orjson output is always compact, so separators can be ignored
+        if self.backend == 'orjson' and kwargs.keys() <= {'indent', 'sort_keys', 'separators'}:
+            kwargs.pop('separators', None)
+            try:
+                return self._orjson_dumps(obj, **kwargs).decode()
+            except orjson.JSONEncodeError:
+                # e.g. integers over 64 bits, which the json module can handle
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.backend == 'orjson' and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if self.backend != 'orjson':
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        try:
+            body = self._orjson_dumps(obj, indent=indent, newline=True)
+        except orjson.JSONEncodeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,92 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+from init import db
+from utils.search import create_search_index
+
+
+def _set_not_null(conn, preparer, table, column):
+    # SET NOT NULL on its own scans the table holding an ACCESS EXCLUSIVE lock. With a validated
+    # check constraint PostgreSQL (12+) skips the scan, and VALIDATE only blocks schema changes
+    table_name = preparer.format_table(table)
+    column_name = preparer.format_column(column)
+    constraint = preparer.quote(f'{table.name}_{column.name}_not_null')
+    drop = text(f'ALTER TABLE {table_name} DROP CONSTRAINT IF EXISTS {constraint}')
+    # Each statement commits on its own (AUTOCOMMIT), so a check left by a run that failed is dropped first
+    conn.execute(drop)
+    conn.execute(text(f'ALTER TABLE {table_name} ADD CONSTRAINT {constraint} CHECK ({column_name} IS NOT NULL) NOT VALID'))
+    try:
+        conn.execute(text(f'ALTER TABLE {table_name} VALIDATE CONSTRAINT {constraint}'))
+        conn.execute(text(f'ALTER TABLE {table_name} ALTER COLUMN {column_name} SET NOT NULL'))
+    finally:
+        # Not left behind if the column still has NULLs, so the next run starts clean
+        conn.execute(drop)
+
+
+def upgrade_schema():
+    """
+    Bring an existing database up to date with the models without dropping anything.
+
+    Missing tables (including the content search table) are created, missing
+    columns are added to the existing tables, then every index declared on the
+    models that isn't in the database yet is added. On PostgreSQL indexes are built with
+    CREATE INDEX CONCURRENTLY so the tables stay writable while it runs, which
+    has to happen outside a transaction, so an AUTOCOMMIT connection is used.
+    If a concurrent build fails it leaves an INVALID index behind that has to be
+    dropped by hand before running this again.
+
+    Only nullable columns can be added this way. On PostgreSQL, existing
+    columns the models declare NOT NULL (e.g. reviews.created) are changed to
+    NOT NULL through a NOT VALID check constraint that is then validated, so
+    the table is only scanned under a lock that lets writes carry on. If the
+    column still holds NULLs this fails and leaves the column as it was; fill
+    them in and run it again. SQLite can't change a column, so an existing SQLite database keeps
+    nullable columns and any NULLs in them have to be filled in. Foreign key
+    constraints on columns that already exist (e.g. a new ON DELETE rule)
+    aren't changed.
+
+    Returns:
+        list: Names of the tables, columns and indexes that were created.
+    """
+    created = []
+    existing_tables = set(inspect(db.engine).get_table_names())
+    missing_tables = [table for table in db.metadata.sorted_tables if table.name not in existing_tables]
+    if missing_tables:
+        # Tables created here get their indexes from create_all
+        db.metadata.create_all(db.engine, tables=missing_tables)
+        created.extend(f'table {table.name}' for table in missing_tables)
+
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        inspector = inspect(conn)
+        concurrently = conn.dialect.name == 'postgresql'
+        ddl = conn.dialect.ddl_compiler(conn.dialect, None)
+        for table in db.metadata.sorted_tables:
+            if table in missing_tables:
+                continue
+            # Columns first, new indexes can be on them. Adding a nullable column doesn't rewrite the table
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                conn.execute(text(f'ALTER TABLE {ddl.preparer.format_table(table)} ADD COLUMN {ddl.get_column_specification(column)}'))
+                created.append(f'column {table.name}.{column.name}')
+            if conn.dialect.name == 'postgresql':
+                nullable_columns = {column['name'] for column in inspector.get_columns(table.name) if column['nullable']}
+                for column in table.columns:
+                    if column.name in nullable_columns and not column.nullable:
+                        _set_not_null(conn, ddl.preparer, table, column)
+                        created.append(f'not null {table.name}.{column.name}')
+
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name in existing_indexes:
+                    continue
+                index.dialect_kwargs['postgresql_concurrently'] = concurrently
+                try:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+                finally:
+                    index.dialect_kwargs['postgresql_concurrently'] = False
+                created.append(f'index {index.name}')
+
+    # Created with IF NOT EXISTS, run flask db reindex-search afterwards to fill it
+    create_search_index()
+    return created
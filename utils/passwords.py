@@ -0,0 +1,127 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt as _bcrypt
+from flask import current_app, abort
+
+
+_executor = None
+_slots = None
+_executor_lock = threading.Lock()
+_metrics_lock = threading.Lock()
+_metrics = {
+    'hash': {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0},
+    'check': {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0},
+}
+
+
+def _hash(password, rounds):
+    # Runs in a pool process, so only plain bcrypt is used here
+    return _bcrypt.hashpw(password.encode('utf-8'), _bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(pw_hash, password):
+    return _bcrypt.checkpw(password.encode('utf-8'), pw_hash.encode('utf-8'))
+
+
+def _get_executor():
+    """
+    Create the process pool the first time it is needed in this worker process.
+
+    Returns:
+        The ProcessPoolExecutor, or None if PASSWORD_HASH_WORKERS is 0.
+    """
+    global _executor, _slots
+    workers = current_app.config['PASSWORD_HASH_WORKERS']
+    if not workers:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            # spawn so the pool processes don't inherit the app's threads and connections
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _slots = threading.BoundedSemaphore(workers * current_app.config['PASSWORD_HASH_QUEUE'])
+    return _executor
+
+
+def _run(kind, fn, *args):
+    """
+    Run a bcrypt call in the process pool (or inline if there is no pool) and record how long it took.
+
+    At most PASSWORD_HASH_WORKERS * PASSWORD_HASH_QUEUE calls can be waiting on
+    the pool at once. If the pool stays full for PASSWORD_HASH_TIMEOUT seconds
+    the request is rejected with 503 instead of piling up more work.
+    """
+    start = time.perf_counter()
+    executor = _get_executor()
+    if executor is None:
+        result = fn(*args)
+    else:
+        if not _slots.acquire(timeout=current_app.config['PASSWORD_HASH_TIMEOUT']):
+            abort(503, description='Too many login requests, please try again shortly.')
+        try:
+            result = executor.submit(fn, *args).result()
+        finally:
+            _slots.release()
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    with _metrics_lock:
+        stats = _metrics[kind]
+        stats['count'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+    current_app.logger.debug('password %s took %.1f ms', kind, elapsed_ms)
+    return result
+
+
+def hash_password(password):
+    """
+    Hash a password with the BCRYPT_LOG_ROUNDS work factor from the app config.
+
+    Returns:
+        str: The bcrypt hash to store in User.password.
+    """
+    return _run('hash', _hash, password, current_app.config['BCRYPT_LOG_ROUNDS'])
+
+
+def check_password(pw_hash, password):
+    """
+    Check a password against a stored bcrypt hash.
+
+    Returns:
+        bool: True if the password matches.
+    """
+    if not pw_hash or not password:
+        return False
+    return _run('check', _check, pw_hash, password)
+
+
+def needs_rehash(pw_hash):
+    """
+    Check if a stored hash was made with a different work factor than the one configured.
+
+    bcrypt hashes look like $2b$12$..., where 12 is the work factor.
+    """
+    try:
+        rounds = int(pw_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return False
+    return rounds != current_app.config['BCRYPT_LOG_ROUNDS']
+
+
+def hash_metrics():
+    """
+    Return the number of hashes and checks done by this process and how long they took.
+
+    Returns:
+        dict: count, average and max time in milliseconds for 'hash' and 'check'.
+    """
+    with _metrics_lock:
+        return {
+            kind: {
+                'count': stats['count'],
+                'average_ms': round(stats['total_ms'] / stats['count'], 2) if stats['count'] else None,
+                'max_ms': round(stats['max_ms'], 2),
+            }
+            for kind, stats in _metrics.items()
+        }
@@ -0,0 +1,117 @@
+import logging
+import threading
+import time
+from init import db
+from models.author import Author
+from models.category import Category
+from models.content import Content
+from models.review import Review
+from utils.deletes import delete_content_where
+
+
+logger = logging.getLogger(__name__)
+
+# The purge has to see the rows that every other query hides
+INCLUDE_DELETED = {'include_deleted': True}
+
+
+def _purge_batches(select_ids, delete, batch_size, pause):
+    # Each batch is its own short transaction, with a pause between batches so live traffic gets the locks
+    total = 0
+    while True:
+        ids = db.session.scalars(select_ids.limit(batch_size), execution_options=INCLUDE_DELETED).all()
+        if ids:
+            delete(ids)
+            db.session.commit()
+            total += len(ids)
+        if len(ids) < batch_size:
+            return total
+        time.sleep(pause)
+
+
+def _delete_ids(model):
+    def delete(ids):
+        db.session.execute(db.delete(model).where(model.id.in_(ids)), execution_options={'synchronize_session': False})
+    return delete
+
+
+def purge_deleted(batch_size=1000, pause=0.5):
+    """
+    Permanently delete soft deleted rows, a small batch at a time.
+
+    Children go before their parents: the reviews of deleted content, then
+    deleted reviews, then deleted content once it has no reviews left (with its
+    rating summary), then deleted authors and categories once they have no
+    content left. A parent that still has children, e.g. content deleted while
+    the purge was running, is left for the next run.
+
+    Each batch deletes at most batch_size rows by primary key in its own
+    transaction and is followed by a pause of pause seconds, so locks are only
+    held briefly and requests can carry on while a large author is purged.
+
+    Returns:
+        dict: The number of rows deleted from each table.
+    """
+    deleted_content = db.select(Content.id).where(Content.deleted_at.is_not(None))
+    steps = [
+        ('reviews of deleted content', db.select(Review.id).where(Review.content_id.in_(deleted_content)), _delete_ids(Review)),
+        ('reviews', db.select(Review.id).where(Review.deleted_at.is_not(None)), _delete_ids(Review)),
+        ('content', deleted_content.where(~Content.reviews.any()),
+         lambda ids: delete_content_where(Content.id.in_(ids))),
+        ('authors', db.select(Author.id).where(Author.deleted_at.is_not(None), ~Author.content.any()), _delete_ids(Author)),
+        ('categories', db.select(Category.id).where(Category.deleted_at.is_not(None), ~Category.content.any()), _delete_ids(Category)),
+    ]
+    return {name: _purge_batches(select_ids, delete, batch_size, pause) for name, select_ids, delete in steps}
+
+
+class PurgeWorker:
+    """
+    Background thread that runs purge_deleted every PURGE_INTERVAL seconds.
+
+    It is started by the first request a process handles, so `flask db`
+    commands don't start one. With several worker processes each runs its own
+    purge; they delete by primary key so they don't conflict, but it is usually
+    better to leave PURGE_INTERVAL at 0 and run `flask db purge` on a schedule.
+
+    Config:
+        PURGE_INTERVAL: Seconds between purges in the background, 0 for none (default 0).
+        PURGE_BATCH_SIZE: Most rows deleted in one transaction (default 1000).
+        PURGE_PAUSE: Seconds to wait between batches (default 0.5).
+    """
+    def __init__(self):
+        self.interval = 0
+        self.batch_size = 1000
+        self.pause = 0.5
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.interval = app.config.setdefault('PURGE_INTERVAL', 0)
+        self.batch_size = app.config.setdefault('PURGE_BATCH_SIZE', 1000)
+        self.pause = app.config.setdefault('PURGE_PAUSE', 0.5)
+        if self.interval:
+            app.before_request(lambda: self._start(app))
+
+    def _start(self, app):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(app,), name='purge', daemon=True)
+                self._thread.start()
+
+    def _run(self, app):
+        while True:
+            time.sleep(self.interval)
+            with app.app_context():
+                try:
+                    counts = purge_deleted(self.batch_size, self.pause)
+                except Exception:
+                    db.session.rollback()
+                    logger.exception('Purging soft deleted rows failed')
+                    continue
+            if any(counts.values()):
+                logger.info('Purged %s', ', '.join(f'{count} {name}' for name, count in counts.items()))
+
+
+purge_worker = PurgeWorker()
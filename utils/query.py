@@ -0,0 +1,336 @@
+import base64
+import json
+from datetime import date
+from functools import lru_cache
+from urllib.parse import urlencode
+from flask import request, abort
+from init import db
+from marshmallow import fields
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload, load_only
+from utils.serializers import compile_dumper
+
+
+@lru_cache(maxsize=None)
+def loader_options(model, schema):
+    """
+    Build the eager loading options needed to serialize a model with a schema.
+
+    This function walks the fields the schema will actually dump (after any
+    only/exclude has been applied). Only the columns the schema dumps are
+    selected (load_only), and for every nested field that maps to a
+    relationship on the model, a loader option is added so the related rows are
+    fetched up front instead of lazy loaded once per row. Collections use
+    selectinload (one extra IN query), single objects use joinedload.
+    Relationships the schema doesn't dump aren't loaded at all.
+
+    Parameters:
+        model: The SQLAlchemy model class being selected.
+        schema: The marshmallow schema instance used to dump the results.
+
+    Returns:
+        tuple: Loader options to pass to Select.options().
+    """
+    mapper = inspect(model)
+    options = []
+
+    # The primary key is always loaded, even if it isn't one of the fields
+    columns = [getattr(model, field.attribute or name) for name, field in schema.fields.items()
+               if (field.attribute or name) in mapper.column_attrs]
+    if columns:
+        options.append(load_only(*columns))
+
+    for name, field in schema.fields.items():
+        # fields.List(fields.Nested(...)) is used for some collections
+        if isinstance(field, fields.List):
+            field = field.inner
+        if not isinstance(field, fields.Nested):
+            continue
+
+        key = field.attribute or name
+        if key not in mapper.relationships:
+            continue
+        relationship = mapper.relationships[key]
+        attribute = getattr(model, key)
+
+        option = selectinload(attribute) if relationship.uselist else joinedload(attribute)
+        # Recurse so nested schemas get their own relationships loaded too
+        nested_options = loader_options(relationship.mapper.class_, field.schema)
+        if nested_options:
+            option = option.options(*nested_options)
+        options.append(option)
+
+    return tuple(options)
+
+
+def eager_load(stmt, model, schema):
+    """
+    Add the eager loading options for a schema to a select statement.
+
+    Usage:
+        stmt = eager_load(db.select(Review), Review, reviews_schema)
+
+    Returns:
+        The statement with the loader options applied.
+    """
+    return stmt.options(*loader_options(model, schema))
+
+
+# Not bounded: the keys are subsets of a schema's fields in the schema's own order, so there are
+# only so many. Evicting one would make a new instance, and loader_options and compile_dumper
+# (keyed by instance) would keep an entry for each of them
+@lru_cache(maxsize=None)
+def _only_schema(schema_type, only, many):
+    return schema_type(only=only, many=many)
+
+
+def select_fields(schema):
+    """
+    Narrow a schema to the fields listed in ?fields=, e.g. ?fields=id,author.
+
+    The returned schema is also what eager_load() is given, so the SQL query
+    only selects the matching columns and nested relationships that weren't
+    asked for aren't loaded at all. Without ?fields= the schema is returned as is.
+
+    Returns:
+        The schema to dump (and build the query) with.
+    """
+    value = request.args.get('fields')
+    if not value:
+        return schema
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = [name for name in requested if name not in schema.fields]
+    if unknown or not requested:
+        abort(400, description=f'fields can only include: {", ".join(schema.fields)}.')
+    # Schemas are cached per field list so eager_load() can reuse its options. The list is put in
+    # the schema's order so every ordering of the same fields gets the same schema
+    only = tuple(name for name in schema.fields if name in requested)
+    return _only_schema(type(schema), only, schema.many)
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def ids_arg():
+    """
+    Read a comma separated list of ids from ?ids=, e.g. ?ids=3,1,2.
+
+    Returns:
+        list: The ids in the order given with duplicates removed, or None if
+        ?ids= wasn't given. Aborts with 400 if an id isn't a number or there
+        are more than MAX_PAGE_SIZE of them.
+    """
+    value = request.args.get('ids')
+    if value is None:
+        return None
+    try:
+        ids = list(dict.fromkeys(int(id) for id in value.split(',') if id.strip()))
+    except ValueError:
+        abort(400, description='ids must be a comma separated list of whole numbers.')
+    if not ids or len(ids) > MAX_PAGE_SIZE:
+        abort(400, description=f'Between 1 and {MAX_PAGE_SIZE} ids must be provided.')
+    return ids
+
+
+def load_by_ids(model, schema, ids):
+    """
+    Load the rows with the given ids in one WHERE id IN (...) query, with eager loading.
+
+    Returns:
+        dict: The rows found, keyed by id.
+    """
+    stmt = eager_load(db.select(model).where(model.id.in_(ids)), model, schema)
+    return {row.id: row for row in db.session.scalars(stmt)}
+
+
+def batch_response(model, schema, ids, name):
+    """
+    Dump the rows with the given ids in the order they were asked for.
+
+    Ids that don't exist get an error object in their place, so the response
+    always has one entry per id.
+
+    Parameters:
+        name (str): What the rows are called in the not found message, e.g. 'Content'.
+
+    Returns:
+        list: One dumped row or error object per id.
+    """
+    rows = load_by_ids(model, schema, ids)
+    dump_row = compile_dumper(schema)
+    return [dump_row(rows[id]) if id in rows else {'id': id, 'Error': f'{name} not found with the id {id}'}
+            for id in ids]
+
+
+def int_arg(name, default=None, minimum=None):
+    """
+    Read an integer query string parameter, aborting with 400 if it is invalid.
+    """
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        abort(400, description=f'{name} must be a whole number.')
+    if minimum is not None and value < minimum:
+        abort(400, description=f'{name} must be at least {minimum}.')
+    return value
+
+
+def paginate(stmt, id_column):
+    """
+    Apply keyset (cursor) pagination to a statement ordered by id descending.
+
+    The page is read from the ?limit= and ?after_id= query string parameters.
+    Instead of OFFSET, the next page is selected with WHERE id < after_id, which
+    the primary key index can seek to directly, so deep pages cost the same as
+    the first one. One extra row is fetched to find out if there is a next page.
+
+    Parameters:
+        stmt: A select statement already ordered by id_column descending.
+        id_column: The primary key column used as the cursor (e.g. Content.id).
+
+    Returns:
+        tuple: The list of rows for this page and the cursor for the next page,
+        or None if this is the last page.
+    """
+    limit = min(int_arg('limit', DEFAULT_PAGE_SIZE, minimum=1), MAX_PAGE_SIZE)
+    after_id = int_arg('after_id')
+
+    if after_id is not None:
+        stmt = stmt.where(id_column < after_id)
+
+    rows = db.session.scalars(stmt.limit(limit + 1)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1].id
+    return rows, None
+
+
+def page_headers(next_cursor, param='after_id'):
+    """
+    Build the response headers that point the client at the next page.
+
+    Parameters:
+        next_cursor: The value of param for the next page, or None.
+        param (str): The query string parameter the cursor goes in.
+
+    Returns:
+        dict: X-Next-Cursor and a Link header with rel="next", or an empty
+        dict if there is no next page.
+    """
+    if next_cursor is None:
+        return {}
+    args = request.args.to_dict(flat=False)
+    args[param] = [str(next_cursor)]
+    next_url = f'{request.base_url}?{urlencode(args, doseq=True)}'
+    return {'X-Next-Cursor': str(next_cursor), 'Link': f'<{next_url}>; rel="next"'}
+
+
+def date_arg(name):
+    """
+    Read a YYYY-MM-DD query string parameter, aborting with 400 if it is invalid.
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        abort(400, description=f'{name} must be a date in this format: YYYY-MM-DD.')
+
+
+def float_arg(name):
+    """
+    Read a number query string parameter, aborting with 400 if it is invalid.
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        abort(400, description=f'{name} must be a number.')
+
+
+def _encode_cursor(value, id):
+    if isinstance(value, date):
+        value = value.isoformat()
+    data = json.dumps([value, id]).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def _decode_cursor(cursor, sort_column):
+    try:
+        value, id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if value is not None and sort_column.type.python_type is date:
+            value = date.fromisoformat(value)
+        return value, int(id)
+    except (ValueError, TypeError, NotImplementedError):
+        abort(400, description='after is not a valid cursor.')
+
+
+def sort_order(sort_column, id_column, descending=True):
+    """
+    Build the ORDER BY for a sort column with the id to break ties and NULLs last.
+
+    NOT NULL columns are sorted without NULLS LAST, so PostgreSQL can read one
+    (sort_column, id) index forwards or backwards for either direction.
+    """
+    nullable = getattr(sort_column, 'nullable', True)
+    if descending:
+        order = sort_column.desc()
+        return (order.nulls_last() if nullable else order), id_column.desc()
+    order = sort_column.asc()
+    return (order.nulls_last() if nullable else order), id_column.asc()
+
+
+def paginate_sorted(stmt, sort_column, id_column, descending=True):
+    """
+    Apply keyset pagination to a statement sorted by a column other than the id.
+
+    The rows are ordered by (sort_column, id) with NULLs last, and the page is
+    read from ?limit= and ?after=, an opaque cursor holding the sort value and
+    id of the last row on the previous page. Each page continues with
+    WHERE (sort_column, id) comes after the cursor. For a NOT NULL column that
+    is all there is, so an index on (sort_column, id) can seek to it directly;
+    a nullable column also needs OR sort_column IS NULL, which can't be seeked.
+
+    Parameters:
+        stmt: A select statement without an ORDER BY.
+        sort_column: The column to sort by, e.g. Content.published.
+        id_column: The primary key, used to break ties.
+        descending (bool): Sort highest first if True, lowest first if False.
+
+    Returns:
+        tuple: The list of rows for this page and the cursor for the next page,
+        or None if this is the last page.
+    """
+    limit = min(int_arg('limit', DEFAULT_PAGE_SIZE, minimum=1), MAX_PAGE_SIZE)
+    cursor = request.args.get('after')
+
+    stmt = stmt.order_by(*sort_order(sort_column, id_column, descending))
+
+    if cursor:
+        value, last_id = _decode_cursor(cursor, sort_column)
+        past_id = id_column < last_id if descending else id_column > last_id
+        nullable = getattr(sort_column, 'nullable', True)
+        if value is None:
+            # Already into the NULLs at the end, only ids are left to compare
+            stmt = stmt.where(sort_column.is_(None), past_id)
+        else:
+            past_value = sort_column < value if descending else sort_column > value
+            after = [past_value, db.and_(sort_column == value, past_id)]
+            if nullable:
+                # The NULLs come after every value
+                after.append(sort_column.is_(None))
+            stmt = stmt.where(db.or_(*after))
+
+    rows = db.session.execute(stmt.add_columns(sort_column).limit(limit + 1)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last, last_value = rows[-1]
+        return [row for row, _ in rows], _encode_cursor(last_value, last.id)
+    return [row for row, _ in rows], None
@@ -0,0 +1,166 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from init import db
+from models.content_rating import ContentRating
+from models.review import Review
+
+
+# INSERT ... ON CONFLICT DO NOTHING for each supported database
+INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def _insert_missing_summaries(content_ids):
+    """
+    Create an empty summary for each content item that doesn't have one yet, before they are locked.
+
+    SELECT ... FOR UPDATE can't lock a row that doesn't exist, so two first
+    reviews for the same content would both add a summary and one would fail
+    on the primary key. With ON CONFLICT DO NOTHING the second insert waits
+    for the first transaction and then does nothing, and both go on to lock
+    the same row. The ids are inserted in order so two batches can't deadlock.
+    """
+    insert = INSERTS.get(db.engine.dialect.name)
+    if insert is None:
+        # Other databases fall back to adding the summary in update_rating(s)
+        return
+    stmt = insert(ContentRating).on_conflict_do_nothing(index_elements=['content_id'])
+    db.session.execute(stmt, [{'content_id': content_id, 'review_count': 0, 'rating_sum': 0, 'histogram': {}}
+                              for content_id in sorted(content_ids)])
+
+
+def update_rating(content_id, added=None, removed=None):
+    """
+    Incrementally update the rating summary for one content item.
+
+    This is called in the same transaction as the review being created, changed
+    or deleted, so the summary is committed together with the review. The
+    summary row is created if it is missing (see _insert_missing_summaries),
+    then locked with SELECT ... FOR UPDATE so concurrent reviews for the same
+    content don't overwrite each other's counts.
+
+    Parameters:
+        content_id (int): The content the review belongs to.
+        added (int): The rating being added, if any.
+        removed (int): The rating being removed, if any.
+    """
+    _insert_missing_summaries([content_id])
+    stmt = db.select(ContentRating).filter_by(content_id=content_id).with_for_update()
+    summary = db.session.scalar(stmt)
+    if not summary:
+        summary = ContentRating(content_id=content_id, review_count=0, rating_sum=0, histogram={})
+        db.session.add(summary)
+
+    # JSON columns don't track changes in place, so build a new dict
+    histogram = dict(summary.histogram or {})
+    if removed is not None:
+        removed = int(removed)
+        summary.review_count -= 1
+        summary.rating_sum -= removed
+        histogram[str(removed)] = histogram.get(str(removed), 0) - 1
+        if histogram[str(removed)] <= 0:
+            del histogram[str(removed)]
+    if added is not None:
+        added = int(added)
+        summary.review_count += 1
+        summary.rating_sum += added
+        histogram[str(added)] = histogram.get(str(added), 0) + 1
+
+    summary.histogram = histogram
+    summary.rating_average = summary.rating_sum / summary.review_count if summary.review_count else None
+
+
+def update_ratings(ratings):
+    """
+    Add many new ratings to the rating summaries at once.
+
+    The batch version of update_rating for reviews inserted together. The
+    summaries of every content item involved are read and locked with one
+    SELECT ... FOR UPDATE (in content_id order, so two batches can't deadlock)
+    and written back in the same flush. Missing summaries are created first
+    with INSERT ... ON CONFLICT DO NOTHING, like update_rating.
+
+    Parameters:
+        ratings: An iterable of (content_id, rating) pairs being added.
+    """
+    histograms = {}
+    for content_id, rating in ratings:
+        histogram = histograms.setdefault(content_id, {})
+        histogram[str(int(rating))] = histogram.get(str(int(rating)), 0) + 1
+    if not histograms:
+        return
+
+    _insert_missing_summaries(histograms)
+    stmt = (
+        db.select(ContentRating)
+        .where(ContentRating.content_id.in_(histograms))
+        .order_by(ContentRating.content_id)
+        .with_for_update()
+    )
+    summaries = {summary.content_id: summary for summary in db.session.scalars(stmt)}
+    for content_id, added in histograms.items():
+        summary = summaries.get(content_id)
+        if not summary:
+            summary = ContentRating(content_id=content_id, review_count=0, rating_sum=0, histogram={})
+            db.session.add(summary)
+
+        histogram = dict(summary.histogram or {})
+        for rating, count in added.items():
+            histogram[rating] = histogram.get(rating, 0) + count
+            summary.review_count += count
+            summary.rating_sum += int(rating) * count
+        summary.histogram = histogram
+        summary.rating_average = summary.rating_sum / summary.review_count
+
+
+def _summary(content_id, histogram):
+    review_count = sum(histogram.values())
+    rating_sum = sum(int(rating) * count for rating, count in histogram.items())
+    return {
+        'content_id': content_id,
+        'review_count': review_count,
+        'rating_sum': rating_sum,
+        'rating_average': rating_sum / review_count,
+        'histogram': histogram,
+    }
+
+
+def rebuild_ratings(batch_size=1000):
+    """
+    Rebuild every rating summary from the reviews table.
+
+    The reviews are grouped by (content_id, rating) in the database, so only
+    one small row per rating value per content comes back. The summaries are
+    built from those counts and inserted with executemany in batches.
+
+    Returns:
+        int: The number of content items with a rating summary.
+    """
+    db.session.execute(db.delete(ContentRating))
+
+    stmt = (
+        db.select(Review.content_id, Review.rating, db.func.count(Review.id))
+        .group_by(Review.content_id, Review.rating)
+        .order_by(Review.content_id)
+    )
+    batch = []
+    total = 0
+    current_id, histogram = None, {}
+    for content_id, rating, count in db.session.execute(stmt):
+        if content_id != current_id and histogram:
+            batch.append(_summary(current_id, histogram))
+            histogram = {}
+        current_id = content_id
+        histogram[str(rating)] = count
+
+        if len(batch) >= batch_size:
+            db.session.execute(db.insert(ContentRating), batch)
+            total += len(batch)
+            batch = []
+
+    if histogram:
+        batch.append(_summary(current_id, histogram))
+    if batch:
+        db.session.execute(db.insert(ContentRating), batch)
+        total += len(batch)
+
+    db.session.commit()
+    return total
@@ -0,0 +1,268 @@
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from flask import g, request, has_request_context
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from flask_jwt_extended.exceptions import JWTExtendedException
+from flask_sqlalchemy.session import Session
+from jwt.exceptions import PyJWTError
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.sql import Select
+from utils.db_pool import engine_options
+
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Most users who wrote recently that are remembered for read-your-writes
+MAX_RECENT_WRITERS = 100000
+
+# 0 when the replica has replayed everything it has received, so an idle
+# primary doesn't make its replicas look like they are falling behind
+POSTGRES_LAG_SQL = text('''
+    SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+           ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+''')
+
+
+class RoutingSession(Session):
+    """
+    Session that sends the SELECTs of read requests to the replica chosen for the request.
+
+    Everything else uses the primary: writes, requests that aren't GET, HEAD or
+    OPTIONS, CLI commands, and every statement after the session has written
+    anything, so reads inside a write transaction see its changes.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # Raw SQL counts as a write, it can't be told apart
+        if self._flushing or (clause is not None and not isinstance(clause, Select)):
+            self.info['wrote'] = True
+        elif bind is None and clause is not None and has_request_context():
+            engine = g.get('read_engine')
+            if engine is not None and not self.info.get('wrote') and not (self.new or self.dirty or self.deleted):
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class Replica:
+    """
+    A replica's engines and the result of its last health check.
+
+    async_engine is only set when the app is served with asgi.py, see ReadReplicas.add_async_engines.
+    """
+    def __init__(self, url):
+        self.engine = create_engine(url, **engine_options(url))
+        self.async_engine = None
+        self.url = self.engine.url.render_as_string(hide_password=True)
+        self.healthy = True
+        self.lag = None
+        self.error = None
+        self.checked_at = None
+        self.reads = 0
+        self.lock = threading.Lock()
+
+
+class ReadReplicas:
+    """
+    Routes the queries of GET requests to read replicas of the database.
+
+    Each read request picks one healthy replica in turn and all of its SELECTs
+    go there (see RoutingSession, and utils/asgi.py for the async read path,
+    which reads from the replica's asyncio engine). Replicas are health checked when they are
+    picked and their last check is older than REPLICA_HEALTH_INTERVAL: a replica
+    that can't be reached, or on PostgreSQL is more than REPLICA_MAX_LAG seconds
+    behind, is skipped until a later check passes. A replica that loses its
+    connection mid-request is marked unhealthy straight away. With no healthy
+    replica, reads use the primary.
+
+    For REPLICA_READ_YOUR_WRITES seconds after a user's successful write, their
+    own read requests (with a valid token) use the primary, so a review they
+    just posted is there when they load the page again. Recent writers are
+    remembered per worker process, like the LRU cache.
+
+    A write invalidates the response cache, but the next read can fill it again
+    from a replica that hasn't replayed the write yet. So a recent writer's
+    reads also skip the cached response, and the response they read from the
+    primary is stored in its place. Anyone else, and the writer once the
+    window is over, can still be given a cached response that is up to
+    REPLICA_MAX_LAG seconds behind, until it expires after CACHE_TTL or the
+    next write invalidates it.
+
+    Config:
+        DATABASE_REPLICA_URLS: List of replica database URLs (default none, everything uses the primary).
+        REPLICA_HEALTH_INTERVAL: Seconds between health checks of a replica (default 10).
+        REPLICA_MAX_LAG: Most seconds a PostgreSQL replica can be behind and still be used (default 30).
+        REPLICA_READ_YOUR_WRITES: Seconds a user's reads stay on the primary after they write, 0 for off (default 5).
+    """
+    def __init__(self):
+        self.replicas = []
+        self.health_interval = 10
+        self.max_lag = 30
+        self.read_your_writes = 5
+        self._next = itertools.count()
+        self._recent_writers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        urls = app.config.setdefault('DATABASE_REPLICA_URLS', [])
+        self.health_interval = app.config.setdefault('REPLICA_HEALTH_INTERVAL', 10)
+        self.max_lag = app.config.setdefault('REPLICA_MAX_LAG', 30)
+        self.read_your_writes = app.config.setdefault('REPLICA_READ_YOUR_WRITES', 5)
+        self.replicas = [Replica(url) for url in urls]
+        if not self.replicas:
+            return
+
+        for replica in self.replicas:
+            event.listen(replica.engine, 'handle_error', self._handle_error(replica))
+        app.before_request(self._choose_engine)
+        app.after_request(self._note_write)
+
+    def add_async_engines(self, create_async_engine):
+        """
+        Give each replica an asyncio engine for the async read path.
+
+        Parameters:
+            create_async_engine: Called with a replica's URL, returns an AsyncEngine.
+        """
+        for replica in self.replicas:
+            replica.async_engine = create_async_engine(replica.engine.url)
+            event.listen(replica.async_engine.sync_engine, 'handle_error', self._handle_error(replica))
+
+    def _handle_error(self, replica):
+        def handle_error(context):
+            if context.is_disconnect:
+                self._mark(replica, False, error=str(context.original_exception))
+        return handle_error
+
+    def _mark(self, replica, healthy, lag=None, error=None):
+        if replica.healthy and not healthy:
+            logger.warning('Read replica %s is unhealthy, reads are going elsewhere: %s', replica.url,
+                           error or f'{lag:.1f}s behind')
+        elif healthy and not replica.healthy:
+            logger.warning('Read replica %s is healthy again', replica.url)
+        replica.healthy, replica.lag, replica.error = healthy, lag, error
+        replica.checked_at = time.monotonic()
+
+    def check(self, replica):
+        """
+        Check a replica can be queried and, on PostgreSQL, how far behind the primary it is.
+
+        Returns:
+            bool: Whether the replica can be used.
+        """
+        try:
+            with replica.engine.connect() as conn:
+                if replica.engine.dialect.name == 'postgresql':
+                    lag = float(conn.scalar(POSTGRES_LAG_SQL))
+                else:
+                    conn.scalar(text('SELECT 1'))
+                    lag = 0.0
+        except Exception as e:
+            self._mark(replica, False, error=str(e))
+            return False
+        self._mark(replica, lag <= self.max_lag, lag=lag)
+        return replica.healthy
+
+    def _is_healthy(self, replica):
+        stale = replica.checked_at is None or time.monotonic() - replica.checked_at >= self.health_interval
+        # One request runs the check, the others use the last result meanwhile
+        if stale and replica.lock.acquire(blocking=False):
+            try:
+                return self.check(replica)
+            finally:
+                replica.lock.release()
+        return replica.healthy
+
+    def pick(self):
+        """
+        Pick the next healthy replica.
+
+        Returns:
+            Replica: A healthy replica, or None if there isn't one.
+        """
+        start = next(self._next)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if self._is_healthy(replica):
+                replica.reads += 1
+                return replica
+        return None
+
+    def _user_id(self):
+        # Any problem with the token is left for the route to report
+        try:
+            verify_jwt_in_request(optional=True)
+            return get_jwt_identity()
+        except (JWTExtendedException, PyJWTError):
+            return None
+
+    def _wrote_recently(self):
+        if not self._recent_writers or 'Authorization' not in request.headers:
+            return False
+        user_id = self._user_id()
+        with self._lock:
+            until = self._recent_writers.get(user_id)
+        return until is not None and until > time.monotonic()
+
+    def choose(self):
+        """
+        Choose where the current request reads from, once per request.
+
+        A read by a user who wrote in the last REPLICA_READ_YOUR_WRITES seconds
+        uses the primary and sets g.refresh_cache so the response cache doesn't
+        answer it. Other reads get the next healthy replica. Picking one can
+        run its health check, which blocks, so the async read path calls this
+        in a worker thread before the before_request hooks run.
+
+        Returns:
+            Replica: The replica to read from, or None for the primary.
+        """
+        if 'read_replica' in g:
+            return g.read_replica
+        replica = None
+        if request.method in READ_METHODS and self.replicas:
+            if self._wrote_recently():
+                g.refresh_cache = True
+            else:
+                replica = self.pick()
+        g.read_replica = replica
+        if replica is not None:
+            g.read_engine = replica.engine
+        return replica
+
+    def _choose_engine(self):
+        self.choose()
+
+    def _note_write(self, response):
+        if request.method in READ_METHODS or response.status_code >= 400 or not self.read_your_writes:
+            return response
+        try:
+            user_id = get_jwt_identity()
+        except RuntimeError:
+            # The route didn't need a token, e.g. registering
+            return response
+        with self._lock:
+            self._recent_writers[user_id] = time.monotonic() + self.read_your_writes
+            self._recent_writers.move_to_end(user_id)
+            while len(self._recent_writers) > MAX_RECENT_WRITERS:
+                self._recent_writers.popitem(last=False)
+        return response
+
+    def metrics(self):
+        """
+        Report the health of each replica.
+
+        Returns:
+            dict: Per replica its URL (without the password), whether it is
+            healthy, its lag, the last error, reads routed to it and its pool status.
+        """
+        return {'replicas': [{
+            'url': replica.url,
+            'healthy': replica.healthy,
+            'lag_seconds': None if replica.lag is None else round(replica.lag, 3),
+            'error': replica.error,
+            'reads': replica.reads,
+            'pool': replica.engine.pool.status(),
+        } for replica in self.replicas], 'read_your_writes_seconds': self.read_your_writes}
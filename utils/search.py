@@ -0,0 +1,172 @@
+import re
+from flask import abort
+from sqlalchemy import text, bindparam, table, column
+from init import db
+from models.content import Content
+
+
+REINDEX_BATCH_SIZE = 1000
+
+# The search table isn't a model because its column types are database specific:
+# a tsvector with a GIN index on PostgreSQL, an FTS5 virtual table on SQLite.
+POSTGRES_DDL = [
+    "CREATE TABLE IF NOT EXISTS content_search (content_id INTEGER PRIMARY KEY, document TSVECTOR NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_content_search_document ON content_search USING GIN (document)",
+]
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS content_search USING fts5(title, author, genre, description, tokenize='porter')",
+]
+
+# Title matches count the most, then author and genre, then description
+POSTGRES_INDEX = text("""
+    INSERT INTO content_search (content_id, document)
+    SELECT content.id,
+           setweight(to_tsvector('english', coalesce(content.title, '')), 'A') ||
+           setweight(to_tsvector('english', coalesce(authors.author, '')), 'B') ||
+           setweight(to_tsvector('english', coalesce(content.genre, '')), 'B') ||
+           setweight(to_tsvector('english', coalesce(content.description, '')), 'C')
+    FROM content JOIN authors ON authors.id = content.author_id
+    WHERE content.id IN :ids
+    ON CONFLICT (content_id) DO UPDATE SET document = EXCLUDED.document
+""").bindparams(bindparam('ids', expanding=True))
+POSTGRES_SEARCH = text("""
+    SELECT content_id FROM content_search, websearch_to_tsquery('english', :q) AS query
+    WHERE document @@ query
+    ORDER BY ts_rank(document, query) DESC, content_id DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+SQLITE_INDEX = text("""
+    INSERT INTO content_search (rowid, title, author, genre, description)
+    SELECT content.id, content.title, authors.author, content.genre, content.description
+    FROM content JOIN authors ON authors.id = content.author_id
+    WHERE content.id IN :ids
+""").bindparams(bindparam('ids', expanding=True))
+# bm25 scores are lower for better matches, the weights follow the column order
+SQLITE_SEARCH = text("""
+    SELECT rowid FROM content_search WHERE content_search MATCH :q
+    ORDER BY bm25(content_search, 10.0, 5.0, 5.0, 1.0), rowid DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+REMOVE = text("DELETE FROM content_search WHERE content_id IN :ids").bindparams(bindparam('ids', expanding=True))
+SQLITE_REMOVE = text("DELETE FROM content_search WHERE rowid IN :ids").bindparams(bindparam('ids', expanding=True))
+
+
+def _dialect():
+    name = db.engine.dialect.name
+    if name not in ('postgresql', 'sqlite'):
+        abort(501, description=f'Search is not supported on {name}.')
+    return name
+
+
+def create_search_index(bind=None):
+    """
+    Create the content_search table and its index if they don't exist yet.
+    """
+    bind = bind or db.engine
+    ddl = POSTGRES_DDL if bind.dialect.name == 'postgresql' else SQLITE_DDL
+    with bind.begin() as conn:
+        for statement in ddl:
+            conn.execute(text(statement))
+
+
+def drop_search_index():
+    with db.engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS content_search"))
+
+
+def index_content(ids):
+    """
+    Add or refresh the search entries for the given content ids.
+
+    This runs in the current session's transaction, so it is committed (or
+    rolled back) together with the change to the content.
+    """
+    ids = list(ids)
+    if not ids:
+        return
+    if _dialect() == 'postgresql':
+        db.session.execute(POSTGRES_INDEX, {'ids': ids})
+    else:
+        # FTS5 tables have no upsert, so replace the rows
+        db.session.execute(SQLITE_REMOVE, {'ids': ids})
+        db.session.execute(SQLITE_INDEX, {'ids': ids})
+
+
+def index_content_where(condition):
+    """
+    Refresh the search entries for every content row matching a condition, in batches.
+
+    Usage:
+        index_content_where(Content.author_id == author.id)
+    """
+    ids = db.session.scalars(db.select(Content.id).where(condition)).all()
+    for start in range(0, len(ids), REINDEX_BATCH_SIZE):
+        index_content(ids[start:start + REINDEX_BATCH_SIZE])
+
+
+def remove_content(ids):
+    """
+    Remove the search entries for the given content ids.
+    """
+    ids = list(ids)
+    if not ids:
+        return
+    db.session.execute(REMOVE if _dialect() == 'postgresql' else SQLITE_REMOVE, {'ids': ids})
+
+
+def remove_content_where(condition):
+    """
+    Remove the search entries for every content row matching a condition, in one statement.
+
+    Run it before the content rows are deleted.
+
+    Usage:
+        remove_content_where(Content.author_id == author.id)
+    """
+    key = 'content_id' if _dialect() == 'postgresql' else 'rowid'
+    search = table('content_search', column(key))
+    db.session.execute(db.delete(search).where(search.c[key].in_(db.select(Content.id).where(condition))))
+
+
+def rebuild_search_index():
+    """
+    Rebuild the whole search index from the content table.
+
+    Returns:
+        int: The number of content items indexed.
+    """
+    create_search_index()
+    db.session.execute(text("DELETE FROM content_search"))
+    index_content_where(db.true())
+    db.session.commit()
+    return db.session.scalar(text("SELECT count(*) FROM content_search"))
+
+
+def _fts5_query(q):
+    # Quote every word so punctuation in the search can't be read as FTS5 syntax
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', q))
+
+
+def search_content(q, limit, offset):
+    """
+    Find content matching a search, best matches first.
+
+    Parameters:
+        q (str): The search text. Every word has to match somewhere in the
+            title, description, genre or author name.
+        limit (int): Max results to return.
+        offset (int): Results to skip.
+
+    Returns:
+        list: Content ids in ranked order.
+    """
+    params = {'limit': limit, 'offset': offset}
+    if _dialect() == 'postgresql':
+        return db.session.scalars(POSTGRES_SEARCH, {**params, 'q': q}).all()
+
+    q = _fts5_query(q)
+    if not q:
+        return []
+    return db.session.scalars(SQLITE_SEARCH, {**params, 'q': q}).all()
@@ -0,0 +1,150 @@
+import random
+from datetime import date, timedelta
+from init import db, bcrypt, cache
+from models.author import Author
+from models.category import Category
+from models.content import Content
+from models.review import Review
+from models.user import User
+from utils.ratings import rebuild_ratings
+from utils.search import rebuild_search_index
+
+
+DEFAULT_BATCH_SIZE = 10000
+# Every generated user can log in with this password
+SEED_PASSWORD = 'password1'
+
+CATEGORIES = ['Novel', 'Short Story', 'Manga', 'Thesis', 'Poetry', 'Essay', 'Autobiography',
+              'Article', 'Biography', 'Picture Book', 'Comic']
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David',
+               'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah',
+               'Charles', 'Karen', 'Haruki', 'Yuki', 'Aisha', 'Omar', 'Priya', 'Arjun', 'Mei', 'Wei', 'Lucia', 'Mateo']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson',
+              'Martin', 'Lee', 'Tanaka', 'Sato', 'Khan', 'Patel', 'Singh', 'Chen', 'Wang', 'Rossi', 'Silva', 'Nguyen']
+TITLE_WORDS = ['Shadow', 'River', 'Garden', 'Winter', 'Silent', 'Empire', 'Stars', 'Ocean', 'Memory', 'Fire',
+               'Glass', 'Mountain', 'Dream', 'Storm', 'Secret', 'Light', 'Forest', 'City', 'Last', 'Broken',
+               'Golden', 'Night', 'Journey', 'House', 'Island', 'Letters', 'Machine', 'Crown', 'Wolf', 'Harbour']
+GENRES = ['Fantasy', 'Science Fiction', 'Mystery', 'Thriller', 'Romance', 'Horror', 'Historical', 'Adventure',
+          'Literary', 'Crime', 'Young Adult', 'Humour', 'Drama', 'Dystopian', 'Slice of Life', 'Philosophy',
+          'Travel', 'Science', 'History', 'Memoir']
+PUBLISHERS = ['Penguin', 'HarperCollins', 'Macmillan', 'Hachette', 'Simon and Schuster', 'Shueisha',
+              'Kodansha', 'Allen and Unwin', 'Faber', 'Bloomsbury', 'Vintage', 'Scholastic']
+DESCRIPTION_WORDS = ['a', 'the', 'story', 'of', 'young', 'old', 'family', 'war', 'love', 'loss', 'city', 'village',
+                     'secret', 'journey', 'across', 'world', 'friendship', 'betrayal', 'hope', 'mystery', 'years',
+                     'after', 'before', 'between', 'two', 'lives', 'changed', 'forever', 'detective', 'kingdom']
+COMMENTS = ['Loved it', 'Could not put it down', 'Not for me', 'Slow start but worth it', 'A classic',
+            'Beautifully written', 'The ending was disappointing', 'Would read again', 'Overrated',
+            'Great characters', 'Too long', 'Recommended to all my friends', None]
+# Share of reviews with each rating, most reviews are positive
+RATING_WEIGHTS = {1: 5, 2: 10, 3: 20, 4: 35, 5: 30}
+
+
+def _skewed(rng, ids):
+    # A few ids get most of the picks (popular content, prolific authors and reviewers)
+    return ids[int(len(ids) * rng.random() ** 2)]
+
+
+def _insert(model, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(db.insert(model), rows[start:start + batch_size])
+        db.session.commit()
+
+
+def _insert_generated(model, count, make_row, batch_size):
+    # Rows are generated one batch at a time, millions of dicts are never held at once
+    for start in range(0, count, batch_size):
+        db.session.execute(db.insert(model), [make_row(i) for i in range(start, min(start + batch_size, count))])
+        db.session.commit()
+
+
+def seed_large(users, content, reviews, authors=None, categories=None, batch_size=DEFAULT_BATCH_SIZE, seed=None):
+    """
+    Generate a large amount of realistic synthetic data.
+
+    Rows are added to whatever is in the database already and inserted with
+    executemany in batches, one commit per batch. Content popularity and author
+    and reviewer activity are skewed so a few rows have many reviews or content
+    items, like real data. The rating summaries and search index are rebuilt
+    and the response cache is cleared at the end.
+
+    Every generated user's email is user<id>@example.com and their password is
+    SEED_PASSWORD. The password is hashed once and shared, hashing it for every
+    user would take hours.
+
+    Parameters:
+        users (int): Users to add.
+        content (int): Content items to add.
+        reviews (int): Reviews to add.
+        authors (int): Authors to add, one per 20 content items by default.
+        categories (int): Categories to add. By default the categories from
+            `flask db seed` are added if they don't exist yet.
+        batch_size (int): Rows inserted per statement.
+        seed (int): Random seed, the same seed generates the same data.
+
+    Returns:
+        dict: The number of rows added to each table.
+    """
+    rng = random.Random(seed)
+    authors = max(content // 20, 1) if authors is None else authors
+    today = date.today()
+
+    existing = set(db.session.scalars(db.select(Category.category)))
+    names = [name for name in CATEGORIES if name not in existing]
+    number = 1
+    while categories is not None and len(names) < categories:
+        if f'Category {number}' not in existing:
+            names.append(f'Category {number}')
+        number += 1
+    names = names if categories is None else names[:categories]
+    _insert(Category, [{'category': name} for name in names], batch_size)
+
+    _insert_generated(Author, authors, lambda i: {
+        'author': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+    }, batch_size)
+
+    # Emails use the next free ids so they stay unique when seeding again
+    first_user = (db.session.scalar(db.select(db.func.max(User.id))) or 0) + 1
+    password = bcrypt.generate_password_hash(SEED_PASSWORD).decode('utf-8')
+    _insert_generated(User, users, lambda i: {
+        'first_name': rng.choice(FIRST_NAMES),
+        'last_name': rng.choice(LAST_NAMES),
+        'year_born': rng.randint(1940, 2010),
+        'email': f'user{first_user + i}@example.com',
+        'password': password,
+        'is_admin': False,
+    }, batch_size)
+
+    category_ids = db.session.scalars(db.select(Category.id)).all()
+    author_ids = db.session.scalars(db.select(Author.id)).all()
+    if content and not (category_ids and author_ids):
+        raise ValueError('Content needs at least one author and one category')
+    _insert_generated(Content, content, lambda i: {
+        'title': f'The {rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS)}',
+        'author_id': _skewed(rng, author_ids),
+        'category_id': rng.choice(category_ids),
+        'genre': rng.choice(GENRES),
+        'description': ' '.join(rng.choices(DESCRIPTION_WORDS, k=rng.randint(8, 40))).capitalize(),
+        'published': date(rng.randint(1900, today.year - 1), rng.randint(1, 12), rng.randint(1, 28)),
+        'publisher': rng.choice(PUBLISHERS),
+    }, batch_size)
+
+    user_ids = db.session.scalars(db.select(User.id)).all()
+    content_ids = db.session.scalars(db.select(Content.id)).all()
+    if reviews and not (user_ids and content_ids):
+        raise ValueError('Reviews need at least one user and one content item')
+    ratings, weights = list(RATING_WEIGHTS), list(RATING_WEIGHTS.values())
+    _insert_generated(Review, reviews, lambda i: {
+        'rating': rng.choices(ratings, weights)[0],
+        'comment': rng.choice(COMMENTS),
+        'created': today - timedelta(days=rng.randint(0, 3 * 365)),
+        'user_id': _skewed(rng, user_ids),
+        'content_id': _skewed(rng, content_ids),
+    }, batch_size)
+
+    rebuild_ratings()
+    rebuild_search_index()
+    cache.invalidate('content', 'reviews', 'author', 'category')
+
+    return {'categories': len(names), 'authors': authors, 'users': users,
+            'content': content, 'reviews': reviews}
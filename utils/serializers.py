@@ -0,0 +1,115 @@
+from datetime import date, datetime
+from functools import lru_cache
+from marshmallow import fields, missing
+from init import sql_metrics
+
+
+# Types an Inferred field passes through unchanged (Integer, Float, Boolean,
+# String and Raw all return these values as they are)
+PLAIN_TYPES = {int, float, bool, str, dict, list, tuple, set}
+ISO_TYPES = {date, datetime}
+
+
+def _inferred(value, field, attr, obj):
+    """
+    Serialize a value the same way marshmallow's Inferred field would.
+    """
+    if value is None:
+        return None
+    value_type = type(value)
+    if value_type in PLAIN_TYPES:
+        return value
+    if value_type in ISO_TYPES:
+        return value.isoformat()
+    # Anything unusual (Decimal, UUID, timedelta...) goes through marshmallow
+    return field._serialize(value, attr, obj)
+
+
+def _has_dump_hooks(schema):
+    # _hooks is a defaultdict that marshmallow leaves empty entries (and plain
+    # string keys like 'validates') in, so look the dump hooks up with get()
+    return any(schema._hooks.get((tag, many)) for tag in ('pre_dump', 'post_dump') for many in (True, False))
+
+
+@lru_cache(maxsize=None)
+def compile_dumper(schema):
+    """
+    Generate a function that dumps one object exactly like schema.dump() does.
+
+    marshmallow works out how to serialize every field of every row at dump
+    time. This function does that work once per schema (and only/exclude
+    combination, since those are separate schema instances): it reads the
+    schema's dump_fields and writes the source of a function that reads each
+    attribute and converts it directly, then compiles it. Nested schemas get
+    their own compiled functions. Field types without a fast path, and schemas
+    with pre/post dump hooks, fall back to marshmallow so the output is always
+    identical.
+
+    Parameters:
+        schema: A marshmallow schema instance. many is ignored, the returned
+            function always dumps a single object.
+
+    Returns:
+        A function taking one object and returning a dict.
+    """
+    if _has_dump_hooks(schema):
+        return lambda obj: schema.dump(obj, many=False)
+
+    namespace = {'_inferred': _inferred, '_missing': missing, '_plain': PLAIN_TYPES}
+    lines = ['def dump(obj):', '    out = {}']
+    for index, (name, field) in enumerate(schema.dump_fields.items()):
+        attr = field.attribute or name
+        key = field.data_key if field.data_key is not None else name
+        field_ref = f'_f{index}'
+        namespace[field_ref] = field
+        getter = f'obj.{attr}' if attr.isidentifier() else f'getattr(obj, {attr!r})'
+
+        if type(field) is fields.Inferred:
+            # The common types are checked inline to save a call per value
+            lines.append(f'    value = {getter}')
+            lines.append(f'    out[{key!r}] = value if value is None or type(value) in _plain '
+                         f'else _inferred(value, {field_ref}, {attr!r}, obj)')
+        elif type(field) is fields.String:
+            lines.append(f'    value = {getter}')
+            lines.append(f'    out[{key!r}] = value if value is None or type(value) is str else str(value)')
+        elif type(field) is fields.Nested:
+            nested_ref = f'_n{index}'
+            namespace[nested_ref] = compile_dumper(field.schema)
+            lines.append(f'    value = {getter}')
+            if field.many:
+                lines.append(f'    out[{key!r}] = None if value is None else [{nested_ref}(item) for item in value]')
+            else:
+                lines.append(f'    out[{key!r}] = None if value is None else {nested_ref}(value)')
+        elif type(field) is fields.List and type(field.inner) is fields.Nested and not field.inner.many:
+            nested_ref = f'_n{index}'
+            namespace[nested_ref] = compile_dumper(field.inner.schema)
+            lines.append(f'    value = {getter}')
+            lines.append(f'    out[{key!r}] = None if value is None else [{nested_ref}(item) for item in value]')
+        else:
+            # No fast path for this field type, let marshmallow serialize it
+            lines.append(f'    value = {field_ref}.serialize({attr!r}, obj, accessor=_accessor)')
+            lines.append(f'    if value is not _missing:')
+            lines.append(f'        out[{key!r}] = value')
+            namespace['_accessor'] = schema.get_attribute
+    lines.append('    return out')
+
+    exec(compile('\n'.join(lines), f'<dumper {type(schema).__name__}>', 'exec'), namespace)
+    return namespace['dump']
+
+
+def dump(schema, data):
+    """
+    Dump data with a schema using its compiled dumper.
+
+    This is a drop in replacement for schema.dump(data): a list is returned
+    for schemas created with many=True, a dict otherwise.
+
+    Usage:
+        return dump(reviews_schema, reviews)
+    """
+    dumper = compile_dumper(schema)
+    if schema.many:
+        data = list(data)
+        sql_metrics.note_result_size(len(data))
+        return [dumper(obj) for obj in data]
+    return dumper(data)
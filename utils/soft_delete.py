@@ -0,0 +1,39 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session, with_loader_criteria
+from init import db
+
+
+class SoftDeleteMixin:
+    """
+    Mixin for models whose rows are soft deleted.
+
+    Deleting sets deleted_at and the row is hidden from every ORM query from
+    then on, including relationship loads and the async read path. The rows are
+    removed for good later, in small batches, by utils.purge.
+
+    Pass execution_options={'include_deleted': True} to a query that needs to
+    see deleted rows, e.g. the purge itself.
+    """
+    deleted_at = db.Column(db.DateTime)
+
+    @classmethod
+    def not_deleted(cls):
+        """
+        The condition that hides this model's deleted rows, overridden by models that are also hidden through a parent.
+        """
+        return cls.deleted_at.is_(None)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _hide_deleted(execute_state):
+    # Listening on the Session class covers the app's sessions and the async read path's.
+    # Relationship and column loads already carry the criteria from the query that loaded the parent
+    if (execute_state.is_select
+            and not execute_state.is_column_load
+            and not execute_state.is_relationship_load
+            and not execute_state.execution_options.get('include_deleted', False)):
+        execute_state.statement = execute_state.statement.options(
+            # include_aliases extends the criteria to aliased() entities. With an unmapped mixin as the
+            # target, SQLAlchemy 2.0.18 also only matches the mapped subclasses when it is set (see tests/test_soft_delete.py)
+            with_loader_criteria(SoftDeleteMixin, lambda cls: cls.not_deleted(), include_aliases=True)
+        )
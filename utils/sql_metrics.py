@@ -0,0 +1,206 @@
+import json
+import logging
+import re
+import threading
+import time
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+logger = logging.getLogger(__name__)
+
+
+def _one_line(statement, limit=200):
+    statement = re.sub(r'\s+', ' ', statement).strip()
+    return statement if len(statement) <= limit else statement[:limit - 3] + '...'
+
+
+class SQLMetrics:
+    """
+    Opt-in per-request SQL instrumentation.
+
+    Every statement is timed with engine events. For each request the number of
+    statements, the total time spent in the database and the slowest
+    statements are:
+
+    - added to the response as a Server-Timing header (shown in the browser dev
+      tools) and an X-Query-Count header,
+    - logged as one JSON line on the utils.sql_metrics logger at INFO,
+    - added up per route for GET /metrics/sql.
+
+    A statement slower than SQL_SLOW_QUERY_MS is logged as a warning, inside
+    or outside a request. Requests that look like an N+1 are flagged with an
+    X-Query-Warning header and a warning: the same statement running
+    SQL_REPEAT_THRESHOLD or more times, or a route whose query count has gone
+    up with the number of items it returned (see note_result_size).
+
+    Streamed responses run their queries after the headers are sent, so their
+    headers only count the queries before the stream started. The log line is
+    written when the request ends and includes all of them.
+
+    Config:
+        SQL_INSTRUMENTATION: Turn the instrumentation on (default False).
+        SQL_SLOW_QUERY_MS: Statements slower than this are logged (default 100).
+        SQL_SLOWEST_STATEMENTS: Slowest statements reported per request (default 3).
+        SQL_REPEAT_THRESHOLD: Runs of one statement in a request that flag an N+1 (default 5).
+    """
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_ms = 100
+        self.slowest = 3
+        self.repeat_threshold = 5
+        self._routes = {}
+        self._lock = threading.Lock()
+        self._listening = False
+
+    def init_app(self, app):
+        self.enabled = app.config.setdefault('SQL_INSTRUMENTATION', False)
+        self.slow_query_ms = app.config.setdefault('SQL_SLOW_QUERY_MS', 100)
+        self.slowest = app.config.setdefault('SQL_SLOWEST_STATEMENTS', 3)
+        self.repeat_threshold = app.config.setdefault('SQL_REPEAT_THRESHOLD', 5)
+        if not self.enabled:
+            return
+
+        # Listening on the Engine class covers every engine the app creates
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._listening = True
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _request_stats(self):
+        if 'sql_metrics' not in g:
+            g.sql_metrics = {'count': 0, 'ms': 0.0, 'statements': {}, 'result_size': None}
+        return g.sql_metrics
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not self.enabled:
+            return
+        conn.info.setdefault('sql_metrics_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('sql_metrics_start')
+        if not self.enabled or not starts:
+            return
+        elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+        if elapsed_ms >= self.slow_query_ms:
+            logger.warning(json.dumps({
+                'event': 'slow_query',
+                'path': request.path if has_request_context() else None,
+                'ms': round(elapsed_ms, 2),
+                'statement': _one_line(statement, 1000),
+            }))
+        if not has_request_context():
+            return
+
+        stats = self._request_stats()
+        stats['count'] += 1
+        stats['ms'] += elapsed_ms
+        runs = stats['statements'].setdefault(statement, [0, 0.0])
+        runs[0] += 1
+        runs[1] = max(runs[1], elapsed_ms)
+
+    def note_result_size(self, size):
+        """
+        Record how many items the current request is returning.
+
+        Used to spot routes whose query count grows with the size of the result.
+        Called by utils.serializers.dump() for schemas with many=True.
+        """
+        if self.enabled and has_request_context():
+            self._request_stats()['result_size'] = size
+
+    def _summary(self):
+        stats = self._request_stats()
+        slowest = sorted(stats['statements'].items(), key=lambda item: item[1][1], reverse=True)[:self.slowest]
+        repeated = {statement: runs for statement, (runs, _) in stats['statements'].items() if runs >= self.repeat_threshold}
+        return stats, slowest, repeated
+
+    def _after_request(self, response):
+        stats, slowest, repeated = self._summary()
+        timings = [f'db;dur={stats["ms"]:.2f};desc="{stats["count"]} queries"']
+        for index, (statement, (runs, ms)) in enumerate(slowest, start=1):
+            # Header values have to be latin-1 and the description can't contain quotes
+            desc = _one_line(statement, 100).replace('"', "'").encode('ascii', 'replace').decode()
+            timings.append(f'sql{index};dur={ms:.2f};desc="{desc}"')
+        response.headers['Server-Timing'] = ', '.join(timings)
+        response.headers['X-Query-Count'] = str(stats['count'])
+        if repeated:
+            response.headers['X-Query-Warning'] = 'n+1'
+        return response
+
+    def _teardown_request(self, exc):
+        stats, slowest, repeated = self._summary()
+        endpoint = request.endpoint or request.path
+        grows = self._record_route(endpoint, stats)
+
+        logger.info(json.dumps({
+            'event': 'request_sql',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint,
+            'queries': stats['count'],
+            'db_ms': round(stats['ms'], 2),
+            'result_size': stats['result_size'],
+            'slowest': [{'ms': round(ms, 2), 'runs': runs, 'statement': _one_line(statement)}
+                        for statement, (runs, ms) in slowest],
+        }))
+        for statement, runs in repeated.items():
+            logger.warning(json.dumps({
+                'event': 'repeated_query',
+                'endpoint': endpoint,
+                'runs': runs,
+                'statement': _one_line(statement),
+            }))
+        if grows:
+            logger.warning(json.dumps({'event': 'queries_grow_with_results', 'endpoint': endpoint, **grows}))
+
+    def _record_route(self, endpoint, stats):
+        # Returns the two samples the first time a route's query count is seen growing with its result size
+        with self._lock:
+            route = self._routes.setdefault(endpoint, {
+                'requests': 0, 'queries': 0, 'db_ms': 0.0, 'max_queries': 0,
+                'smallest': None, 'largest': None, 'grows_with_results': False,
+            })
+            route['requests'] += 1
+            route['queries'] += stats['count']
+            route['db_ms'] += stats['ms']
+            route['max_queries'] = max(route['max_queries'], stats['count'])
+
+            # Empty results are left out, eager loads don't run a query when there is nothing to load
+            size = stats['result_size']
+            if not size:
+                return None
+            sample = {'result_size': size, 'queries': stats['count']}
+            if route['smallest'] is None or size < route['smallest']['result_size']:
+                route['smallest'] = sample
+            if route['largest'] is None or size > route['largest']['result_size']:
+                route['largest'] = sample
+            smallest, largest = route['smallest'], route['largest']
+            if not route['grows_with_results'] and largest['queries'] > smallest['queries'] \
+                    and largest['result_size'] > smallest['result_size']:
+                route['grows_with_results'] = True
+                return {'smallest': smallest, 'largest': largest}
+        return None
+
+    def metrics(self):
+        """
+        Report the query counts and database time of every route since the process started.
+
+        Returns:
+            dict: Per route the requests seen, average and max queries, average
+            database time, and whether its query count grows with its result size.
+        """
+        with self._lock:
+            return {'enabled': self.enabled, 'routes': {
+                endpoint: {
+                    'requests': route['requests'],
+                    'average_queries': round(route['queries'] / route['requests'], 2),
+                    'max_queries': route['max_queries'],
+                    'average_db_ms': round(route['db_ms'] / route['requests'], 2),
+                    'grows_with_results': route['grows_with_results'],
+                }
+                for endpoint, route in sorted(self._routes.items())
+            }}
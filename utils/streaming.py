@@ -0,0 +1,67 @@
+from flask import Response, request, abort, current_app, stream_with_context
+from init import db
+from utils.query import int_arg
+from utils.serializers import compile_dumper
+
+
+STREAM_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+STREAM_CHUNK_SIZE = 1000
+
+
+def wants_stream():
+    """
+    Check if the client asked for a streamed response with ?stream=json or ?stream=ndjson.
+    """
+    stream_format = request.args.get('stream')
+    if stream_format is None:
+        return False
+    if stream_format not in STREAM_FORMATS:
+        abort(400, description=f'stream must be one of: {", ".join(STREAM_FORMATS)}.')
+    return True
+
+
+def stream_response(stmt, id_column, schema):
+    """
+    Stream every row of a statement to the client without building the full list in memory.
+
+    Rows are read from the database in chunks of STREAM_CHUNK_SIZE using yield_per
+    and each chunk is serialized and written before the next is fetched, so the
+    worker only ever holds one chunk at a time. ?stream=json writes a normal JSON
+    array, ?stream=ndjson writes one JSON object per line. ?after_id= can be used
+    to resume an interrupted stream.
+
+    Parameters:
+        stmt: A select statement ordered by id_column descending.
+        id_column: The primary key column used for ?after_id=.
+        schema: The marshmallow schema (many=True) used to dump the rows.
+
+    Returns:
+        A streamed Flask Response.
+    """
+    stream_format = request.args.get('stream')
+    after_id = int_arg('after_id')
+    if after_id is not None:
+        stmt = stmt.where(id_column < after_id)
+    stmt = stmt.execution_options(yield_per=STREAM_CHUNK_SIZE)
+    dumps = current_app.json.dumps
+    dump_row = compile_dumper(schema)
+
+    def generate():
+        rows = db.session.scalars(stmt)
+        if stream_format == 'ndjson':
+            for chunk in rows.partitions():
+                yield ''.join(dumps(dump_row(row)) + '\n' for row in chunk)
+            return
+
+        yield '['
+        first = True
+        for chunk in rows.partitions():
+            body = ','.join(dumps(dump_row(row)) for row in chunk)
+            yield body if first else ',' + body
+            first = False
+        yield ']'
+
+    return Response(stream_with_context(generate()), mimetype=STREAM_FORMATS[stream_format])